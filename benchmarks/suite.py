@@ -0,0 +1,290 @@
+"""Benchmark suite against the local fake chromium/chromedriver server (no network)
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --compare results.json  # exits 1 on a regression
+
+Every result is a number where lower is better: seconds, or request/module counts,
+which are deterministic and so catch resolution and import regressions exactly. Timings are the best
+of `--repeat` runs. Results are saved with the platform, python and git revision.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT.joinpath("tests")))
+
+from smart_webdriver_manager import ChromeDriverManager  # noqa: E402
+from smart_webdriver_manager.bundle import export_bundle, import_bundle  # noqa: E402
+from smart_webdriver_manager.cache import directory_size  # noqa: E402
+from smart_webdriver_manager.context import SmartChromeContextManager  # noqa: E402
+from smart_webdriver_manager.metrics import Metrics, subscribe  # noqa: E402
+from smart_webdriver_manager.utils import mktempdir, unpack_zip  # noqa: E402
+
+from fakeserver import FakeChromeServer, make_chromium_zip  # noqa: E402
+
+VERSIONS = list(range(90, 98))
+# snapshots are sparse: every `SPACING`th revision, the last `GAP` revisions below each base position
+GAP = 300
+SPACING = 7
+# what a short-lived process pays to answer from a warm cache
+PROCESS_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from smart_webdriver_manager import ChromeDriverManager
+imported = time.perf_counter()
+ChromeDriverManager(version={version}, base_path={base_path!r}).get_driver()
+print(json.dumps({{
+    "import": imported - start,
+    "get_driver": time.perf_counter() - imported,
+    "network_modules": sum(m in sys.modules for m in ("requests", "urllib3", "backoff", "packaging")),
+}}))
+"""
+
+
+def make_server(args):
+    releases = {v: f"{v}.0.{4000 + v}.0" for v in VERSIONS}
+    releases[0] = releases[VERSIONS[-1]]
+    positions = {release: 900000 + v * 10000 for v, release in releases.items() if v}
+    revisions = [r for p in positions.values() for r in range(p - GAP - 5000, p - GAP, SPACING)]
+    server = FakeChromeServer(releases, positions, revisions)
+    server.latency = {"/driver": args.latency, "/deps.json": args.latency, "/browser": args.latency}
+    server.bandwidth = args.bandwidth
+    return server
+
+
+def manager(server, base_path, version=VERSIONS[-1]):
+    cdm = ChromeDriverManager(version=version, base_path=base_path)
+    server.configure(cdm._cx)
+    return cdm
+
+
+def best(fn, repeat):
+    return min(fn() for _ in range(repeat))
+
+
+def make_browser_zip(scale) -> bytes:
+    with mktempdir() as tmpdir:
+        path = Path(tmpdir, "chrome-linux.zip")
+        make_chromium_zip(path, scale)
+        return path.read_bytes()
+
+
+def bench_cold_install(server, args):
+    def run():
+        with mktempdir() as tmpdir:
+            cdm = manager(server, tmpdir)
+            start = time.perf_counter()
+            cdm.get_driver()
+            cdm.get_browser()
+            return time.perf_counter() - start
+
+    return {"cold_install.seconds": best(run, args.repeat)}
+
+
+def bench_warm_get_driver(server, args):
+    with mktempdir() as tmpdir:
+        manager(server, tmpdir).get_browser()
+        before = len(server.requests)
+        timings = []
+        for _ in range(50):
+            cdm = manager(server, tmpdir)
+            cdm.invalidate()  # time the cache lookup, not the process-wide registry
+            start = time.perf_counter()
+            cdm.get_driver()
+            timings.append(time.perf_counter() - start)
+        return {
+            "warm_get_driver.median_seconds": statistics.median(timings),
+            "warm_get_driver.requests": len(server.requests) - before,
+        }
+
+
+def bench_import(server, args):
+    with mktempdir() as tmpdir:
+        manager(server, tmpdir).get_browser()
+        code = PROCESS_SCRIPT.format(version=VERSIONS[-1], base_path=str(tmpdir))
+        pythonpath = os.pathsep.join(filter(None, [str(ROOT.joinpath("src")), os.getenv("PYTHONPATH")]))
+        env = {**os.environ, "PYTHONPATH": pythonpath}
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout))
+        return {
+            "import.seconds": min(run["import"] for run in runs),
+            "import.network_modules": runs[0]["network_modules"],
+            "warm_process.get_driver_seconds": min(run["get_driver"] for run in runs),
+        }
+
+
+def bench_resolution(server, args):
+    with mktempdir() as tmpdir:
+        metrics = Metrics()
+        unsubscribe = subscribe(metrics)
+        try:
+            before = len(server.requests)
+            cx = server.configure(SmartChromeContextManager(tmpdir))
+            cx.get_browser_release(VERSIONS[-1])
+            cx.close()
+        finally:
+            unsubscribe()
+        probes = metrics.snapshot()["probes"]
+        return {
+            "resolution.requests": len(server.requests) - before,
+            "resolution.probes": probes["found"] + probes["missing"],
+        }
+
+
+def bench_extraction(server, args):
+    with mktempdir() as tmpdir:
+        archive = Path(tmpdir, "chrome-linux.zip")
+        make_chromium_zip(archive, args.scale)
+
+        def run(profile=None):
+            with mktempdir() as workdir:
+                zip_path = Path(workdir, archive.name)
+                shutil.copy(archive, zip_path)
+                start = time.perf_counter()
+                unpack_zip(zip_path, profile)
+                elapsed = time.perf_counter() - start
+                zip_path.unlink()
+                return elapsed, directory_size(workdir)
+
+        full, headless = best(run, args.repeat), best(lambda: run("headless"), args.repeat)
+        return {
+            "extraction.seconds": full[0],
+            "extraction.bytes": full[1],
+            "extraction.headless_seconds": headless[0],
+            "extraction.headless_bytes": headless[1],
+        }
+
+
+def bench_restore(server, args):
+    with mktempdir() as tmpdir:
+        manager(server, tmpdir).get_browser()
+        bundle = Path(tmpdir, "swm.tar.gz")
+
+        def export():
+            start = time.perf_counter()
+            export_bundle(SmartChromeContextManager(tmpdir), bundle)
+            return time.perf_counter() - start
+
+        def restore():
+            with mktempdir() as other:
+                start = time.perf_counter()
+                import_bundle(SmartChromeContextManager(other), bundle)
+                return time.perf_counter() - start
+
+        return {
+            "restore.export_seconds": best(export, args.repeat),
+            "restore.import_seconds": best(restore, args.repeat),
+            "restore.bundle_bytes": bundle.stat().st_size,
+        }
+
+
+def bench_concurrent_installs(server, args):
+    results = {}
+    for n in (1, 2, 4, 8):
+        results[f"concurrent_install.{n}.seconds"] = best(lambda: install_many(server, n), args.repeat)
+    return results
+
+
+def install_many(server, n):
+    with mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        # have `install_many` use the context pointed at the fake server
+        with mock.patch("smart_webdriver_manager.driver.SmartChromeContextManager", return_value=cx):
+            start = time.perf_counter()
+            ChromeDriverManager.install_many(VERSIONS[:n], base_path=tmpdir, max_workers=n)
+            return time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "cold_install": bench_cold_install,
+    "warm_get_driver": bench_warm_get_driver,
+    "import": bench_import,
+    "resolution": bench_resolution,
+    "extraction": bench_extraction,
+    "restore": bench_restore,
+    "concurrent_install": bench_concurrent_installs,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold) -> bool:
+    """Print current vs baseline, returns whether anything regressed beyond `threshold`"""
+    regressed = False
+    print(f"{'benchmark':<36}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<36}{'-':>12}{value:>12.4g}")
+            continue
+        change = (value - old) / old if old else 0.0 if value == old else float("inf")
+        flag = change > threshold
+        regressed |= flag
+        print(f"{name:<36}{old:>12.4g}{value:>12.4g}{change:>+9.0%}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to each server response")
+    parser.add_argument("--bandwidth", type=int, default=50 * 1024 * 1024, help="bytes/second per connection")
+    parser.add_argument("--scale", type=float, default=0.05, help="browser archive size relative to chromium")
+    parser.add_argument("--repeat", type=int, default=3, help="best of n runs")
+    parser.add_argument("--output", help="save results to this json file")
+    parser.add_argument("--compare", help="json results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown counted as regression")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks {', '.join(sorted(unknown))}")
+
+    results = {}
+    with make_server(args) as server:
+        server.browser_zip = make_browser_zip(args.scale)
+        for name in args.benchmarks or BENCHMARKS:
+            results.update(BENCHMARKS[name](server, args))
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "revision": git_revision(),
+            "options": {k: getattr(args, k) for k in ("latency", "bandwidth", "scale", "repeat")},
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline["meta"]["options"] != report["meta"]["options"]:
+            print(f"warning: options differ from the baseline's {baseline['meta']['options']}")
+        return 1 if compare(results, baseline["results"], args.threshold) else 0
+    for name, value in results.items():
+        print(f"{name:<36}{value:>12.4g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-# Avaialble managers
-from smart_webdriver_manager.driver import ChromeDriverManager
+def __getattr__(name):
+    """Available managers, imported on first use"""
+    if name == "ChromeDriverManager":
+        from smart_webdriver_manager.driver import ChromeDriverManager
+
+        globals()[name] = ChromeDriverManager
+        return ChromeDriverManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 __all__ = [
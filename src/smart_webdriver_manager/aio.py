@@ -0,0 +1,301 @@
+"""asyncio counterparts of the context and driver managers
+
+Requires `aiohttp` (`pip install smart-webdriver-manager[async]`). The caches are
+shared with the synchronous managers, so sync and async users see the same installs.
+"""
+import asyncio
+import contextlib
+import functools
+import sys
+import time
+
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+from packaging.version import Version, parse
+
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.driver import DriverManager
+from smart_webdriver_manager.metrics import emit, phase
+from smart_webdriver_manager.utils import StreamDigest
+
+from . import logger
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+LOCK_POLL = 0.1  # seconds between attempts at a held artifact lock, at most
+
+
+async def acquire_lock(lock):
+    """Wait for a `FileLock` on the loop, polling: a thread blocked per waiter would starve the
+    executor that the lock holder needs to finish its install
+    """
+    delay = 0.005
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LOCK_POLL)
+
+
+@contextlib.asynccontextmanager
+async def in_executor(cm):
+    """Enter and exit the context manager `cm` in the default executor"""
+    loop = asyncio.get_running_loop()
+    value = await loop.run_in_executor(None, cm.__enter__)
+    try:
+        yield value
+    except BaseException:
+        if not await loop.run_in_executor(None, cm.__exit__, *sys.exc_info()):
+            raise
+    else:
+        await loop.run_in_executor(None, cm.__exit__, None, None, None)
+
+
+async def download_file_async(url, session, save_dir, digest=None) -> Path:
+    """Stream `url` into `save_dir`, hashed on the way by `digest` (a `StreamDigest`) if given"""
+    name = Path(urlparse(unquote(url)).path).name
+    save_path = Path(save_dir).joinpath(name)
+    digest = digest or StreamDigest()
+    digest.begin(save_path)
+    start = time.perf_counter()
+    with phase("download", url=url):
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            with open(save_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(1024 * 1024):
+                    position = f.tell()
+                    f.write(chunk)
+                    digest.write(0, position, chunk)
+    emit("download", url=url, bytes=save_path.stat().st_size, seconds=time.perf_counter() - start)
+    return save_path
+
+
+class AsyncSmartChromeContextManager(SmartChromeContextManager):
+    """Awaitable `SmartChromeContextManager`
+    - the resolution methods (`get_driver_release`, `get_browser_release`, `find_browser_revision`...)
+      are inherited and return awaitables: only their requests are implemented here, see `_run`
+    - one `aiohttp.ClientSession` (created on first use, at most `limit` connections)
+      is shared by lookups, probes and downloads
+    - cache reads and writes and unpacking run in the default executor; waiting for an
+      artifact lock does not
+    """
+
+    def __init__(self, base_path=None, session=None, limit=100, **kwargs):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required, install smart-webdriver-manager[async]")
+        super().__init__(base_path, session=session, **kwargs)
+        self._limit = limit
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._limit),
+                timeout=aiohttp.ClientTimeout(sock_connect=10, sock_read=60),
+            )
+        return self._session
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+
+    async def _run(self, plan):
+        """`SmartChromeContextManager._run` on the loop: coroutine steps are awaited, the
+        others (cache and metadata reads and writes) run in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        result = error = None
+        while True:
+            try:
+                fn, *args = plan.throw(error) if error is not None else plan.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    result = await fn(*args)
+                else:
+                    result = await loop.run_in_executor(None, functools.partial(fn, *args))
+                error = None
+            except Exception as e:
+                result, error = None, e
+
+    async def _revalidate(self, version, browser=False):
+        """Refresh a stale resolution in a background task (one per version)"""
+
+        async def refresh():
+            try:
+                await self._run(self._refresh(version, browser))
+            except Exception as e:
+                logger.warning(f"Failed to refresh resolution for version {version}: {e}")
+
+        task = self._revalidating.get(version)
+        if task and not task.done():
+            return
+        self._revalidating[version] = asyncio.get_running_loop().create_task(refresh())
+
+    async def _fetch_driver_release(self, version: int = 0) -> Version:
+        logger.debug(f"Getting {self._driver_name} version for {version}")
+        _version = f"_{version}" if version else ""
+        url = f"{self.url_driver_repo_latest}{_version}"
+        with phase("resolve_release", version=version):
+            async with self.session.get(url) as resp:
+                if resp.status == 404:
+                    raise ValueError(f"There is no driver for version {version}")
+                elif resp.status != 200:
+                    raise ValueError(
+                        f"response body:\n{await resp.text()}\n"
+                        f"request url:\n{resp.url}\n"
+                        f"response headers:\n{dict(resp.headers)}\n"
+                    )
+                return parse((await resp.text()).rstrip())
+
+    async def _fetch_browser_position(self, release: Version) -> int:
+        with phase("lookup_position", release=str(release)):
+            async with self.session.get(f"{self.url_browser_deps}?version={str(release)}") as resp:
+                resp.raise_for_status()
+                return int((await resp.json(content_type=None))["chromium_base_position"])
+
+    async def _fetch_listing(self, token=None) -> dict:
+        params = {"delimiter": "/", "prefix": f"{self.browser_platform}/", "fields": "prefixes,nextPageToken"}
+        if token:
+            params["pageToken"] = token
+        async with self.session.get(self.url_browser_list, params=params) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def _probe_browsers(self, revisions: list) -> list:
+        return await asyncio.gather(*(self._probe_browser(revision) for revision in revisions))
+
+    async def _probe_browser(self, revision: int) -> bool:
+        known = self._revision_index.known(revision)
+        if known is not None:
+            return known
+        logger.debug(f"Trying revision {revision} ... ")
+        url = self.browser_url(revision)
+        if self._probe_counter:
+            self._probe_counter(url)
+        async with self.session.head(url, allow_redirects=True) as resp:
+            found = resp.status == 200
+        emit("probe", revision=revision, found=found)
+        return found
+
+    async def get_driver(self, release: str) -> Path:
+        return await self._install(self._driver_cache, self.driver_urls(release), release)
+
+    async def get_browser(self, release: str, revision: str = None) -> Path:
+        return await self._install(self._browser_cache, self.browser_urls(revision), release, revision)
+
+    async def get_browser_user_data(self, release: str, revision: str) -> str:
+        get = functools.partial(self._browser_user_data_cache.get, release, revision)
+        return str(await asyncio.get_running_loop().run_in_executor(None, get))
+
+    async def _install(self, cache, urls, *key) -> Path:
+        loop = asyncio.get_running_loop()
+        binary_path = await loop.run_in_executor(None, functools.partial(cache.get, *key))
+        emit("cache", cache=cache.name, hit=bool(binary_path))
+        if binary_path:
+            logger.debug(f"Already have latest version for {key}")
+            return binary_path
+
+        lock = cache.lock(*key)
+        await acquire_lock(lock)
+        try:
+            binary_path = await loop.run_in_executor(None, functools.partial(cache.get, *key))
+            if binary_path:
+                logger.debug(f"Installed concurrently {key}")
+                return binary_path
+            binary_path = await loop.run_in_executor(None, functools.partial(cache.promote, *key))
+            if binary_path:
+                return binary_path
+
+            for url in urls:
+                logger.debug(f"Getting {url}")
+                try:
+                    async with in_executor(cache.staging(*key)) as staging:
+                        digest = StreamDigest()
+                        f = await download_file_async(url, self.session, staging, digest)
+                        put = functools.partial(cache.put, f, *key, digest=digest.hexdigest())
+                        binary_path = await loop.run_in_executor(None, put)
+                        logger.debug(f"Downloaded {f.name}")
+                    break
+                except aiohttp.ClientError as e:
+                    if url == urls[-1]:
+                        raise
+                    logger.warning(f"Failed to get {url} ({e}), trying the next source")
+        finally:
+            lock.release()
+        return binary_path
+
+
+class AsyncChromeDriverManager(DriverManager):
+    """Awaitable `ChromeDriverManager`
+
+    >>> async with AsyncChromeDriverManager(version=96) as cdm:  # doctest: +SKIP
+    ...     driver_path = await cdm.get_driver()
+    """
+
+    def __init__(self, version: int = 0, base_path=None, **kwargs):
+        super().__init__(version, base_path)
+        self._cx = AsyncSmartChromeContextManager(self._base_path, **kwargs)
+        self._installing = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self._cx.close()
+
+    async def _install(self):
+        if self._installing is None:
+            self._installing = asyncio.ensure_future(self._resolve_and_fetch())
+            self._installing.add_done_callback(self._forget_failed)
+        return await self._installing
+
+    async def _resolve_and_fetch(self):
+        installing = asyncio.current_task()
+        release, revision = await self._cx.get_browser_release(self._version)
+        driver = asyncio.ensure_future(self._cx.get_driver(str(release)))
+        browser = asyncio.ensure_future(self._cx.get_browser(str(release), str(revision)))
+        for download in (driver, browser):
+            download.add_done_callback(functools.partial(self._forget_failed, installing=installing))
+        return release, revision, driver, browser
+
+    def _forget_failed(self, future, installing=None):
+        """Drop the install once its resolution or a download fails, so the next call retries
+        (callers already waiting still get the failure)
+        """
+        installing = installing or future
+        if (future.cancelled() or future.exception() is not None) and self._installing is installing:
+            self._installing = None
+
+    async def get_driver(self) -> str:
+        _, _, driver, _ = await self._install()
+        return str(await driver)
+
+    async def get_browser(self) -> str:
+        _, _, _, browser = await self._install()
+        return str(await browser)
+
+    async def get_browser_user_data(self) -> str:
+        release, revision, _, browser = await self._install()
+        await browser
+        return await self._cx.get_browser_user_data(str(release), str(revision))
+
+    async def remove(self) -> bool:
+        """Forget the resolution and delete the driver and browser from the cache, see `remove_installed`"""
+        installing, self._installing = self._installing, None
+        if installing is not None:
+            release, revision, driver, browser = await installing
+            await asyncio.gather(driver, browser, return_exceptions=True)
+        else:
+            cached = await asyncio.get_running_loop().run_in_executor(None, self._cx.get_cached_release, self._version)
+            if not cached:
+                return False
+            release, revision = cached
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._cx.remove_installed, str(release), str(revision))
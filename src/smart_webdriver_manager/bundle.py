@@ -0,0 +1,272 @@
+"""Portable cache bundles: installed releases packed into one compressed tar
+
+    swm export swm.tar.gz 90-96
+    swm import swm.tar.gz --base-path /ci/cache/swm
+
+Restoring a cache directory file by file (ie from a CI cache) pays for tens of thousands
+of small files; a bundle is one sequential read. It is decompressed by one thread while
+a pool writes the files, and its metadata is relative, rewritten for the importing base
+path. Each artifact is checked against its tree hash before it is placed in the cache.
+
+Layout: `manifest.json` first, then `<cache>/<typ>/<release>[/<revision>]/...` members.
+"""
+import io
+import json
+import os
+import platform
+import shutil
+import stat
+import tarfile
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path, PurePosixPath
+
+from smart_webdriver_manager.cache import SmartCache, directory_size, fingerprint, relative_binary, tree_digest
+from smart_webdriver_manager.metadata import metadata_key
+from smart_webdriver_manager.metrics import phase
+from smart_webdriver_manager.utils import UNPACK_WORKERS
+
+from . import logger
+
+BUNDLE_VERSION = 1
+MANIFEST = "manifest.json"
+COMPRESSION = {".tar": "", ".tgz": "gz", ".gz": "gz", ".xz": "xz", ".bz2": "bz2"}
+INLINE_SIZE = 8 * 1024 * 1024  # larger members are written by the reading thread, unbuffered
+READ_AHEAD = 256 * 1024 * 1024  # bytes read but not yet written, at most
+
+
+def _compression(path) -> str:
+    suffix = Path(path).suffix
+    if suffix not in COMPRESSION:
+        raise ValueError(f"Unknown bundle type {path}, expected one of {', '.join(COMPRESSION)}")
+    return COMPRESSION[suffix]
+
+
+def _artifacts(cx, releases):
+    """(cache, (typ, release, revision), entry) of the drivers and browsers of `releases`"""
+    keys = {}
+    for release, revision in releases:
+        keys[cx._driver_cache, (cx._driver_name, str(release), None)] = None
+        keys[cx._browser_cache, (cx._browser_name, str(release), str(revision))] = None
+    artifacts = []
+    for cache, key in keys:
+        entry = SmartCache.entry(cache, *key)
+        if not entry or not cache._valid(entry, *key):
+            raise ValueError(f"{metadata_key(*key)} is not installed in {cache._base_path}")
+        artifacts.append((cache, key, entry))
+    return artifacts
+
+
+def _arc_root(cache, key) -> PurePosixPath:
+    return PurePosixPath(cache.name, *(k for k in key if k))
+
+
+def _add_tree(tar, root, arc_root):
+    for dirpath, dirs, names in os.walk(root):
+        dirs.sort()
+        for name in sorted(names + [d for d in dirs if Path(dirpath, d).is_symlink()]):
+            file = Path(dirpath, name)
+            st = file.lstat()
+            info = tarfile.TarInfo(str(arc_root.joinpath(file.relative_to(root).as_posix())))
+            info.mode, info.mtime = stat.S_IMODE(st.st_mode), st.st_mtime
+            if file.is_symlink():
+                info.type, info.linkname = tarfile.SYMTYPE, os.readlink(file)
+                tar.addfile(info)
+                continue
+            info.size = st.st_size
+            with open(file, "rb") as f:
+                tar.addfile(info, f)
+
+
+def export_bundle(cx, path, releases=None) -> list:
+    """Pack the drivers and browsers of `releases` ((release, revision) pairs, default all
+    installed) of the context `cx` into the bundle `path` (.tar.gz, .tar.xz, .tar.bz2 or .tar)
+    - resolutions of those releases are included, so a restored cache needs no lookup
+    Returns the manifest's artifacts
+    """
+    path = Path(path)
+    compression = _compression(path)
+    if releases is None:
+        releases = cx.get_installed_releases()
+    artifacts = _artifacts(cx, releases)
+    pairs = {(str(release), str(revision)) for release, revision in releases}
+    manifest = {
+        "bundle_version": BUNDLE_VERSION,
+        "platform": platform.system(),
+        "artifacts": [
+            {
+                "cache": cache.name,
+                "typ": typ,
+                "release": release,
+                "revision": revision,
+                "binary": relative_binary(entry["binary_path"], typ, release, revision).as_posix(),
+                "hash": entry.get("hash"),
+                "tree_hash": entry.get("tree_hash") or tree_digest(cache._artifact_path(typ, release, revision)),
+            }
+            for cache, (typ, release, revision), entry in artifacts
+        ],
+        "resolutions": {
+            key: entry
+            for key, entry in cx._resolution_cache.items().items()
+            if (entry["release"], entry["revision"]) in pairs
+            or (entry["revision"] is None and entry["release"] in {release for release, _ in pairs})
+        },
+    }
+    data = json.dumps(manifest, indent=4).encode()
+    tmp = path.with_name(f".{path.name}.tmp")
+    options = {"compresslevel": 6} if compression == "gz" else {}
+    with phase("export", bundle=str(path)):
+        try:
+            with tarfile.open(tmp, f"w:{compression}", **options) as tar:
+                info = tarfile.TarInfo(MANIFEST)
+                info.size, info.mode = len(data), 0o644
+                tar.addfile(info, io.BytesIO(data))
+                for cache, key, _ in artifacts:
+                    _add_tree(tar, cache._artifact_path(*key), _arc_root(cache, key))
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    logger.info(f"Exported {len(artifacts)} artifacts to {path}")
+    return manifest["artifacts"]
+
+
+def _write_file(path, data, mode, mtime):
+    with open(path, "wb") as f:
+        if isinstance(data, bytes):
+            f.write(data)
+        else:
+            shutil.copyfileobj(data, f, 1024 * 1024)
+    os.chmod(path, mode)
+    os.utime(path, (mtime, mtime))
+
+
+def _member_path(member, targets):
+    """Target and staging path of a bundle member, None if its artifact is skipped
+    Members must stay inside their artifact: no `..`, absolute paths or symlinks leading out,
+    nor paths through a symlink (which a later member could write through).
+    """
+    name = PurePosixPath(member.name)
+    if name.is_absolute() or ".." in name.parts:
+        raise ValueError(f"Unsafe bundle member {member.name}")
+    for depth in (4, 3):
+        root = name.parts[:depth]
+        if root in targets:
+            break
+    else:
+        raise ValueError(f"Bundle member {member.name} is not in its manifest")
+    target = targets[root]
+    if target is None:
+        return None, None
+    rel = name.parts[depth:]
+    if not rel:
+        raise ValueError(f"Unsafe bundle member {member.name}")
+    staging = target["staging"]
+    for i in range(1, len(rel) + 1):
+        if staging.joinpath(*rel[:i]).is_symlink():
+            raise ValueError(f"Bundle member {member.name} is under (or replaces) a symlink")
+    if member.issym():
+        link = PurePosixPath(member.linkname)
+        resolved = os.path.normpath(PurePosixPath(*rel[:-1], link).as_posix())
+        if link.is_absolute() or resolved == ".." or resolved.startswith("../"):
+            raise ValueError(f"Bundle member {member.name} links outside its artifact to {member.linkname}")
+    elif not (member.isfile() or member.isdir()):
+        raise ValueError(f"Unsupported bundle member {member.name}")
+    return target, staging.joinpath(*rel)
+
+
+def import_bundle(cx, path, max_workers=UNPACK_WORKERS) -> list:
+    """Restore the bundle `path` into the caches of the context `cx`
+    - artifacts already installed are skipped, their members read past
+    - files are written by `max_workers` threads while the bundle is decompressed
+    Returns the manifest's artifacts that were imported
+    """
+    caches = {cache.name: cache for cache in (cx._driver_cache, cx._browser_cache)}
+    imported = []
+    try:
+        with ExitStack() as stack, phase("import", bundle=str(path)):
+            tar = stack.enter_context(tarfile.open(path, "r|*"))
+            member = tar.next()
+            if member is None or member.name != MANIFEST:
+                raise ValueError(f"{path} is not a bundle, it does not start with {MANIFEST}")
+            manifest = json.load(tar.extractfile(member))
+            if manifest.get("bundle_version") != BUNDLE_VERSION:
+                raise ValueError(f"Unsupported bundle version {manifest.get('bundle_version')} in {path}")
+            if manifest.get("platform") != platform.system():
+                raise ValueError(f"Bundle {path} was written on {manifest.get('platform')}, not {platform.system()}")
+
+            targets = {}
+            for artifact in manifest["artifacts"]:
+                cache = caches.get(artifact["cache"])
+                if cache is None:
+                    raise ValueError(f"Unknown cache {artifact['cache']} in {path}")
+                key = (artifact["typ"], artifact["release"], artifact["revision"])
+                target = None
+                if not SmartCache.get(cache, *key):
+                    staging = stack.enter_context(SmartCache.staging(cache, *key))
+                    target = {"artifact": artifact, "cache": cache, "key": key, "staging": staging}
+                targets[_arc_root(cache, key).parts] = target
+
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers, thread_name_prefix="swm-import"))
+            pending, pending_bytes = deque(), 0
+            while (member := tar.next()) is not None:
+                target, dest = _member_path(member, targets)
+                if target is None:
+                    continue
+                if member.isdir():
+                    dest.mkdir(parents=True, exist_ok=True)
+                    continue
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if member.issym():
+                    os.symlink(member.linkname, dest)
+                elif member.size > INLINE_SIZE:
+                    _write_file(dest, tar.extractfile(member), member.mode, member.mtime)
+                else:
+                    data = tar.extractfile(member).read()
+                    pending.append((executor.submit(_write_file, dest, data, member.mode, member.mtime), len(data)))
+                    pending_bytes += len(data)
+                    while pending_bytes > READ_AHEAD:
+                        future, size = pending.popleft()
+                        future.result()
+                        pending_bytes -= size
+            for future, _ in pending:
+                future.result()
+
+            extracted = [target for target in targets.values() if target]
+            for target in extracted:  # all or nothing
+                target["tree_hash"] = tree_digest(target["staging"])
+                if target["tree_hash"] != target["artifact"]["tree_hash"]:
+                    raise ValueError(f"{metadata_key(*target['key'])} in {path} does not match its hash")
+            for target in extracted:
+                if _place(target):
+                    imported.append(target["artifact"])
+            cx._resolution_cache.merge(manifest.get("resolutions", {}))
+    except tarfile.TarError as e:
+        raise ValueError(f"Invalid bundle {path}: {e}") from None
+    logger.info(f"Imported {len(imported)} artifacts from {path}")
+    return imported
+
+
+def _place(target) -> bool:
+    """Move a verified artifact into its cache, False if it was installed meanwhile"""
+    artifact, cache, key, staging = target["artifact"], target["cache"], target["key"], target["staging"]
+    with SmartCache.lock(cache, *key):
+        if SmartCache.get(cache, *key):
+            return False
+        size = directory_size(staging)
+        if cache._store:
+            cache._store.dedupe(staging)
+        artifact_path = cache._artifact_path(*key)
+        cache._place(staging, artifact_path)
+        binary_path = artifact_path.joinpath(artifact["binary"])
+        cache._write_metadata(
+            binary_path,
+            *key,
+            size=size,
+            hash=artifact["hash"],
+            tree_hash=target["tree_hash"],
+            fingerprint=fingerprint(binary_path),
+        )
+    return True
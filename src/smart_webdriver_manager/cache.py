@@ -1,12 +1,28 @@
+import bisect
 import datetime
+import hashlib
 import json
+import math
+import os
 import re
 import platform
 import glob
+import queue
+import shutil
+import stat
+import tempfile
+import time
+import uuid
+import weakref
 
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from smart_webdriver_manager.utils import unpack_zip
+from smart_webdriver_manager.metadata import make_metadata_store, metadata_key, metadata_lock
+from smart_webdriver_manager.metrics import emit, phase
+from smart_webdriver_manager.store import ContentStore
+from smart_webdriver_manager.utils import FileLock, clone_tree, unpack_zip, write_json_atomic
 
 from . import logger
 
@@ -17,43 +33,432 @@ DEFAULT_BASE_PATH = {
     "Drawin": Path("~/Library/Application Support/swm").expanduser(),
 }.get(platform.system(), Path("~/.swm").expanduser())
 
+BINARY_SUFFIX = re.compile(r"(ium)?(.(exe|app))?$")
+# `last_access` is only rewritten when older than this (seconds)
+ACCESS_RESOLUTION = 60 * 60
+# release subdirectories holding user data rather than revisions
+USER_DATA_DIRS = ("UserData", "Sessions")
+# staging/orphaned directories younger than this (seconds) may belong to a running install
+STAGING_GRACE = 60 * 60
+
+
+def file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def remove_tree(path):
+    """rmtree that also clears read-only files (deduplicated files, Windows)"""
+
+    def onerror(func, path, exc_info):
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        func(path)
+
+    if Path(path).exists():
+        shutil.rmtree(path, onerror=onerror)
+
+
+def tree_digest(path) -> str:
+    """sha256 over the relative paths and contents of the files under `path` (modes ignored)"""
+    h = hashlib.sha256()
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            file = Path(root, name)
+            content = os.readlink(file) if file.is_symlink() else file_digest(file)
+            h.update(f"{file.relative_to(path).as_posix()}\0{content}\n".encode())
+    return h.hexdigest()
+
+
+def _walk_order(rel):
+    """Sort key of a relative path in `tree_digest`'s walk: a directory's files, then its subdirectories"""
+    parts = rel.split("/")
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+def tree_digest_of(digests) -> str:
+    """`tree_digest` of a tree from its files' sha256 ({relative path: digest}), without reading it"""
+    h = hashlib.sha256()
+    for rel in sorted(digests, key=_walk_order):
+        h.update(f"{rel}\0{digests[rel]}\n".encode())
+    return h.hexdigest()
+
+
+def fingerprint(path) -> str:
+    """Cheap identity of a file, one stat"""
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def directory_size(path) -> int:
+    return sum(Path(root, name).lstat().st_size for root, _, names in os.walk(path) for name in names)
+
+
+def check_artifact(entry, binary_path, artifact_path, full=False) -> str:
+    """Current fingerprint of `binary_path` if the artifact matches `entry`, else None
+    The tree is re-hashed only when the fingerprint changed, or if `full`.
+    """
+    try:
+        current = fingerprint(binary_path)
+    except OSError:
+        logger.warning(f"Missing {binary_path}")
+        return
+    if not entry.get("tree_hash"):
+        return current  # installed by an older version, nothing to check against
+    if current == entry.get("fingerprint") and not full:
+        return current
+    logger.info(f"Verifying {artifact_path}")
+    if tree_digest(artifact_path) != entry["tree_hash"]:
+        logger.warning(f"{artifact_path} does not match its hash")
+        return
+    return current
+
+
+def relative_binary(binary_path, typ, release, revision=None) -> Path:
+    """`binary_path` relative to its artifact directory, wherever that cache was mounted"""
+    parts = Path(binary_path).parts
+    key = tuple(str(p) for p in (typ, release, revision) if p)
+    for i in range(len(parts) - len(key) - 1, -1, -1):
+        if parts[i : i + len(key)] == key:
+            return Path(*parts[i + len(key) :])
+    return Path(parts[-1])
+
 
 class SmartCache(metaclass=ABCMeta):
-    """Shared Cache parent, controls cache behavior"""
+    """Shared Cache parent, controls cache behavior
+    - metadata goes to a pluggable `MetadataStore`: `metadata="json"` (default,
+      `<cache_name>.json`) or `metadata="sqlite"` (indexed `metadata.db`)
+    - artifacts are extracted into a staging directory and renamed into place
+    - `lock` serializes installs of one artifact across processes
+    - with `dedupe`, extracted files are hardlinked into a shared `ContentStore`
+    - `get` records the last access; with `max_size` (bytes) and/or `max_age` (seconds)
+      least recently used artifacts are evicted after each `put`, see `evict`
+    - `extract` names a profile of `EXTRACT_PROFILES` (ie "headless" skips unused locales)
+    - entries record the archive hash, a hash of the extracted tree and a size/mtime
+      fingerprint of the binary. `get` checks the fingerprint (one stat) and re-hashes
+      the tree only when it changed; corrupt artifacts are dropped so they are fetched again
+    - `shared` base paths (default `SWM_SHARED_CACHE`, `os.pathsep` separated) are read-only
+      tiers, ie an NFS mount or an image layer; `promote` copies their artifacts in
+    """
 
-    def __init__(self, cache_name, base_path=None):
+    def __init__(
+        self,
+        cache_name,
+        base_path=None,
+        metadata=None,
+        dedupe=False,
+        max_size=None,
+        max_age=None,
+        extract=None,
+        shared=None,
+    ):
         self._base_path = Path(base_path or DEFAULT_BASE_PATH).expanduser()
-        self._cache_json_path = self._base_path.joinpath(f"{cache_name}.json")
         self._cache_base_path = self._base_path.joinpath(cache_name)
+        self._metadata = make_metadata_store(metadata, cache_name, self._base_path)
+        self._store = ContentStore(self._base_path) if dedupe else None
+        self._max_size = max_size
+        self._max_age = max_age
+        self._extract = extract
+        if shared is None:
+            shared = os.getenv("SWM_SHARED_CACHE", "").split(os.pathsep)
+        elif isinstance(shared, (str, Path)):
+            shared = [shared]
+        self._shared = [Path(p).expanduser() for p in shared if p and Path(p).expanduser() != self._base_path]
+
+    @property
+    def name(self) -> str:
+        return self._cache_base_path.name
+
+    def lock(self, typ, release, revision=None) -> FileLock:
+        """Per-artifact lock, hold it across check-download-put"""
+        return FileLock(self._base_path.joinpath("locks", f"{metadata_key(typ, release, revision)}.lock"))
+
+    def use(self, typ, release, revision=None) -> "UseLock":
+        """Mark an artifact in use (ie a running driver) until the returned lock is released
+        Artifacts in use are not removed, evicted or collected. Each user holds its own lock file.
+        """
+        name = f"{metadata_key(typ, release, revision)}@{uuid.uuid4().hex}.use"
+        lock = UseLock(self._base_path.joinpath("locks", name))
+        lock.acquire()
+        return lock
 
     @abstractmethod
     def get(self, typ, release, revision=None) -> Path:
-        metadata = self._read_metadata()
-        key = f"{typ}_{release}{'_' if revision else ''}{revision or ''}"
-        if key not in metadata:
+        key = metadata_key(typ, release, revision)
+        driver_info = self._metadata.get(typ, release, revision)
+        if not driver_info:
             logger.info(f"There is no {key}, {release}, {revision=} in cache")
             return
-        driver_info = metadata[key]
         path = driver_info["binary_path"]
+        if not self._valid(driver_info, typ, release, revision):
+            self._invalidate(typ, release, revision)
+            return
         logger.info(f"{key} found in cache at path {path}")
+        if time.time() - (driver_info.get("last_access") or 0) > ACCESS_RESOLUTION:
+            self._metadata.update({"last_access": time.time()}, typ, release, revision)
         return Path(path)
 
-    @abstractmethod
-    def put(self, f, typ, release, revision=None) -> Path:
-        path = Path(self._cache_base_path, typ, release, revision or "")
-        path.mkdir(parents=True, mode=0o755, exist_ok=True)
+    def verify(self, typ, release, revision=None) -> bool:
+        """Re-hash the extracted tree against its entry, corrupt artifacts are removed"""
+        entry = self._metadata.get(typ, release, revision)
+        if not entry:
+            return False
+        if self._valid(entry, typ, release, revision, full=True):
+            return True
+        self._invalidate(typ, release, revision, full=True)
+        return False
+
+    def verify_all(self) -> list:
+        """`verify` every artifact, returns the keys of the corrupt (now removed) ones"""
+        return [key for key, _ in self._metadata.items() if not SmartCache.verify(self, *key)]
+
+    def _valid(self, entry, typ, release, revision, full=False) -> bool:
+        current = check_artifact(entry, entry["binary_path"], self._artifact_path(typ, release, revision), full)
+        if current is None:
+            return False
+        if entry.get("tree_hash") and current != entry.get("fingerprint"):
+            self._metadata.update({"fingerprint": current}, typ, release, revision)
+        return True
+
+    def _invalidate(self, typ, release, revision, full=False):
+        """Drop a corrupt artifact, unless someone holds its lock (ie is reinstalling it)"""
+        lock = SmartCache.lock(self, typ, release, revision)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            entry = self._metadata.get(typ, release, revision)
+            if entry and self._valid(entry, typ, release, revision, full):
+                return  # replaced meanwhile
+            logger.warning(f"Removing corrupt {metadata_key(typ, release, revision)}, it will be fetched again")
+            self._metadata.remove(typ, release, revision)
+            remove_tree(self._artifact_path(typ, release, revision))
+        finally:
+            lock.release()
+
+    def entry(self, typ, release, revision=None) -> dict:
+        """Metadata of an installed artifact (`binary_path`, `size`, `hash`, ...)"""
+        return self._metadata.get(typ, release, revision)
 
+    @abstractmethod
+    def put(self, f, typ, release, revision=None, digest=None) -> Path:
+        """Extract the archive `f` into the cache, then delete it
+        - download into `staging(...)` to avoid a copy, otherwise `f` is moved there first
+        - `digest` is the archive's sha256 if already known (ie from `StreamDigest`)
+        """
         f = Path(f)
-        zip_path = f.replace(path.joinpath(f.name))
-        logger.debug("Unzipping...")
-        files = unpack_zip(zip_path)
+        path = self._artifact_path(typ, release, revision)
+        if f.parent.parent == path.parent and f.parent.name.startswith(".staging-"):
+            return self._put_staged(f, path, typ, release, revision, digest)
+        with SmartCache.staging(self, typ, release, revision) as staging:
+            f = Path(shutil.move(str(f), staging))
+            return self._put_staged(f, path, typ, release, revision, digest)
 
+    @contextmanager
+    def staging(self, typ, release, revision=None) -> Path:
+        """Scratch directory beside the artifact's final directory (same filesystem)
+        `put` renames it into place; whatever is left is removed on exit
+        """
+        path = self._artifact_path(typ, release, revision)
+        path.parent.mkdir(parents=True, mode=0o755, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=path.parent))
+        try:
+            yield staging
+        finally:
+            remove_tree(staging)
+
+    def _artifact_path(self, typ, release, revision=None) -> Path:
+        return Path(self._cache_base_path, typ, release, revision or "")
+
+    def _put_staged(self, zip_path, path, typ, release, revision, digest=None) -> Path:
+        staging = zip_path.parent
+        digest = digest or file_digest(zip_path)
+        logger.debug("Unzipping...")
+        with phase("unpack", typ=typ, release=release, revision=revision):
+            digests = {}
+            files = unpack_zip(zip_path, self._extract, digests=digests)
+        zip_path.unlink()
         binary = self._match_binary(files, typ)
+        size = directory_size(staging)
+        tree_hash = tree_digest_of(digests)
+        if self._store:
+            self._store.dedupe(staging, digests)
+        self._place(staging, path)
+
         binary_path = Path(path, binary)
-        self._write_metadata(binary_path, typ, release, revision)
+        self._write_metadata(
+            binary_path,
+            typ,
+            release,
+            revision,
+            size=size,
+            hash=digest,
+            tree_hash=tree_hash,
+            fingerprint=fingerprint(binary_path),
+        )
         logger.info(f"{typ} has been saved in cache at path {path}")
+        if self._max_size is not None or self._max_age is not None:
+            self.evict(self._max_size, self._max_age)
         return binary_path
 
+    def promote(self, typ, release, revision=None) -> Path:
+        """Copy an artifact from the first shared tier holding a valid copy into this cache
+        - call with the artifact's `lock` held, after `get` missed
+        - files are reflinked where possible, else copied; the shared tiers are never written
+        """
+        for base_path in self._shared:
+            try:
+                entry = make_metadata_store(None, self.name, base_path, readonly=True).get(typ, release, revision)
+            except Exception as e:
+                logger.warning(f"Shared cache {base_path} unavailable: {e}")
+                continue
+            if not entry:
+                continue
+            source = Path(base_path, self.name, typ, release, revision or "")
+            binary = relative_binary(entry["binary_path"], typ, release, revision)
+            if check_artifact(entry, source.joinpath(binary), source) is None:
+                continue
+            path = self._artifact_path(typ, release, revision)
+            with SmartCache.staging(self, typ, release, revision) as staging:
+                clone_tree(source, staging)
+                size = directory_size(staging)
+                if self._store:
+                    self._store.dedupe(staging)
+                self._place(staging, path)
+            binary_path = Path(path, binary)
+            self._write_metadata(
+                binary_path,
+                typ,
+                release,
+                revision,
+                size=size,
+                hash=entry.get("hash"),
+                tree_hash=entry.get("tree_hash"),
+                fingerprint=fingerprint(binary_path),
+            )
+            emit("cache", cache=f"{self.name}-shared", hit=True)
+            logger.info(f"{metadata_key(typ, release, revision)} promoted from {base_path}")
+            return binary_path
+        if self._shared:
+            emit("cache", cache=f"{self.name}-shared", hit=False)
+
+    @staticmethod
+    def _place(staging, path):
+        staging.chmod(0o755)
+        if path.exists():
+            logger.debug(f"Replacing orphaned {path}")
+            remove_tree(path)
+        staging.rename(path)
+
+    def remove(self, typ, release, revision=None, blocking=True) -> bool:
+        """Remove an artifact and its metadata
+        - skipped (False) if in use, or if its lock is held and not `blocking`
+        """
+        with SmartCache.removal(self, typ, release, revision, blocking) as delete:
+            if delete:
+                delete()
+            return bool(delete)
+
+    @contextmanager
+    def removal(self, typ, release, revision=None, blocking=True):
+        """Hold the artifact's lock and yield a function deleting it, None if it is locked or in use
+        Nest removals to delete several artifacts all together or not at all.
+        """
+        key = metadata_key(typ, release, revision)
+        lock = SmartCache.lock(self, typ, release, revision)
+        if not lock.acquire(blocking):
+            logger.debug(f"Not removing locked {key}")
+            yield None
+            return
+        try:
+            if self._in_use(typ, release, revision):
+                logger.debug(f"Not removing in-use {key}")
+                yield None
+            else:
+                yield lambda: self._delete(typ, release, revision)
+        finally:
+            lock.release()
+
+    def _delete(self, typ, release, revision=None):
+        self._metadata.remove(typ, release, revision)
+        remove_tree(self._artifact_path(typ, release, revision))
+        logger.info(f"Removed {metadata_key(typ, release, revision)} from cache")
+
+    def evict(self, max_size=None, max_age=None) -> list:
+        """Remove least recently used artifacts until the cache fits `max_size` bytes,
+        and any not accessed for `max_age` seconds. Locked or in-use artifacts are kept.
+        Returns the removed (typ, release, revision) keys
+        """
+        now = time.time()
+        items = sorted(self._metadata.items(), key=lambda item: item[1].get("last_access") or 0)
+        total = sum(entry.get("size") or 0 for _, entry in items)
+        removed = []
+        for key, entry in items:
+            expired = max_age is not None and now - (entry.get("last_access") or 0) > max_age
+            if not expired and (max_size is None or total <= max_size):
+                continue
+            if SmartCache.remove(self, *key, blocking=False):
+                total -= entry.get("size") or 0
+                removed.append(key)
+        if removed and self._store:
+            self._store.prune()
+        return removed
+
+    def collect_garbage(self, grace=STAGING_GRACE) -> int:
+        """Remove what interrupted installs leave behind, returns the bytes freed
+        - staging directories and unreferenced artifact directories older than `grace` seconds
+        - archives left in artifact directories by older versions
+        - content store objects no artifact links to
+        """
+        referenced = {self._artifact_path(*key) for key, _ in self._metadata.items()}
+        freed = 0
+        for path in self._artifact_dirs():
+            if path in referenced:
+                for archive in path.glob("*.zip"):
+                    freed += archive.stat().st_size
+                    archive.unlink()
+            elif time.time() - path.stat().st_mtime > grace and not self._locked_dir(path):
+                logger.info(f"Removing orphaned {path}")
+                freed += directory_size(path)
+                remove_tree(path)
+        for path in self._base_path.joinpath("locks").glob("*@*.use"):
+            lock = FileLock(path)
+            try:
+                if time.time() - path.stat().st_mtime > grace and lock.acquire(blocking=False):
+                    path.unlink()  # left by a crashed user
+            except FileNotFoundError:
+                pass  # released meanwhile
+            finally:
+                lock.release()
+        if self._store:
+            freed += self._store.prune()
+        return freed
+
+    def _artifact_dirs(self):
+        """Directories at the depth of artifacts (staging directories included)"""
+        return self._cache_base_path.glob("*/*")
+
+    def _locked_dir(self, path) -> bool:
+        if path.name.startswith(".staging-"):
+            return False
+        lock = SmartCache.lock(self, *path.relative_to(self._cache_base_path).parts)
+        if not lock.acquire(blocking=False):
+            return True
+        lock.release()
+        return False
+
+    def _in_use(self, typ, release, revision=None) -> bool:
+        """Whether a lock from `use` is held on the artifact; a crashed user's lock is not"""
+        key = glob.escape(metadata_key(typ, release, revision))
+        for path in self._base_path.joinpath("locks").glob(f"{key}@*.use"):
+            lock = FileLock(path)
+            if not lock.acquire(blocking=False):
+                return True
+            lock.release()
+        return False
+
     def _match_binary(self, files: list, typ: str) -> Path:
         logger.debug(f"Matching {typ} in candidate files")
         if len(files) == 1:
@@ -61,64 +466,159 @@ class SmartCache(metaclass=ABCMeta):
         for f in files:
             name = Path(f).name
             # FIXME: Mac will not return the correct app
-            re_match = re.compile(r"(ium)?(.(exe|app))?$")
-            if f'{re_match.sub("", name).lower()}' in f"{typ}":
+            if f'{BINARY_SUFFIX.sub("", name).lower()}' in f"{typ}":
                 return Path(f)
         raise Exception(f"Can't get binary for {typ} among {files}")
 
-    def _write_metadata(self, binary_path, typ, release, revision):
-        metadata = self._read_metadata()
-        key = f"{typ}_{release}{'_' if revision else ''}{revision or ''}"
+    def _write_metadata(self, binary_path, typ, release, revision, **fields):
         data = {
-            key: {
-                "timestamp": datetime.date.today().strftime("%m/%d/%Y"),
-                "binary_path": str(binary_path),
-            }
+            "timestamp": datetime.date.today().strftime("%m/%d/%Y"),
+            "binary_path": str(binary_path),
+            "last_access": time.time(),
+            **fields,
         }
-        metadata.update(data)
-        with open(self._cache_json_path, "w+") as outfile:
-            json.dump(metadata, outfile, indent=4)
+        self._metadata.put(data, typ, release, revision)
 
-    def _read_metadata(self):
-        if Path(self._cache_json_path).exists():
-            with open(self._cache_json_path, "r") as outfile:
-                return json.load(outfile)
-        return {}
+
+class UseLock(FileLock):
+    """Lock of `SmartCache.use`, its file is removed on release"""
+
+    def release(self):
+        if self._fd is not None:
+            try:
+                self._path.unlink()
+            except OSError:  # open files cannot be removed on Windows, see `collect_garbage`
+                pass
+        super().release()
 
 
 class DriverCache(SmartCache):
     """Driver Cache"""
 
-    def __init__(self, driver_name, base_path=None):
-        super().__init__("drivers", base_path)
+    def __init__(self, driver_name, base_path=None, **options):
+        super().__init__("drivers", base_path, **options)
         self._driver_name = driver_name
 
     def get(self, release):
         return super().get(self._driver_name, release)
 
-    def put(self, f, release):
-        return super().put(f, self._driver_name, release)
+    def entry(self, release):
+        return super().entry(self._driver_name, release)
+
+    def put(self, f, release, digest=None):
+        return super().put(f, self._driver_name, release, digest=digest)
+
+    def lock(self, release):
+        return super().lock(self._driver_name, release)
+
+    def use(self, release):
+        return super().use(self._driver_name, release)
+
+    def staging(self, release):
+        return super().staging(self._driver_name, release)
+
+    def remove(self, release, blocking=True):
+        return super().remove(self._driver_name, release, blocking=blocking)
+
+    def removal(self, release, blocking=True):
+        return super().removal(self._driver_name, release, blocking=blocking)
+
+    def verify(self, release):
+        return super().verify(self._driver_name, release)
+
+    def promote(self, release):
+        return super().promote(self._driver_name, release)
+
+    def releases(self) -> list:
+        """Releases with an entry in the cache"""
+        return [release for (typ, release, _), _ in self._metadata.items() if typ == self._driver_name]
 
 
 class BrowserCache(SmartCache):
     """Browser Cache"""
 
-    def __init__(self, browser_name, base_path=None):
-        super().__init__("browsers", base_path)
+    def __init__(self, browser_name, base_path=None, **options):
+        super().__init__("browsers", base_path, **options)
         self._browser_name = browser_name
 
     def get(self, release, revision=None):
         return super().get(self._browser_name, release, revision)
 
-    def put(self, f, release, revision=None):
-        return super().put(f, self._browser_name, release, revision)
+    def entry(self, release, revision=None):
+        return super().entry(self._browser_name, release, revision)
+
+    def put(self, f, release, revision=None, digest=None):
+        return super().put(f, self._browser_name, release, revision, digest=digest)
+
+    def lock(self, release, revision=None):
+        return super().lock(self._browser_name, release, revision)
+
+    def use(self, release, revision=None):
+        return super().use(self._browser_name, release, revision)
+
+    def staging(self, release, revision=None):
+        return super().staging(self._browser_name, release, revision)
+
+    def remove(self, release, revision=None, blocking=True):
+        return super().remove(self._browser_name, release, revision, blocking=blocking)
+
+    def removal(self, release, revision=None, blocking=True):
+        return super().removal(self._browser_name, release, revision, blocking=blocking)
+
+    def verify(self, release, revision=None):
+        return super().verify(self._browser_name, release, revision)
+
+    def promote(self, release, revision=None):
+        return super().promote(self._browser_name, release, revision)
+
+    def revisions(self) -> list:
+        """(release, revision) pairs with an entry in the cache"""
+        items = self._metadata.items()
+        return [(release, revision) for (typ, release, revision), _ in items if typ == self._browser_name]
+
+    def evict(self, max_size=None, max_age=None) -> list:
+        """Also drops a release's user data once its last revision is gone"""
+        removed = super().evict(max_size, max_age)
+        self._remove_empty_releases()
+        return removed
+
+    def collect_garbage(self, grace=STAGING_GRACE) -> int:
+        freed = super().collect_garbage(grace)
+        self._remove_empty_releases()
+        return freed
+
+    def _artifact_dirs(self):
+        for path in self._cache_base_path.glob("*/*/*"):
+            if path.name not in USER_DATA_DIRS:
+                yield path
+
+    def _remove_empty_releases(self):
+        for release in self._cache_base_path.glob("*/*"):
+            if any(p.name not in USER_DATA_DIRS for p in release.iterdir()):
+                continue
+            if not _release_in_use(release):
+                logger.info(f"Removing {release} with no remaining revisions")
+                remove_tree(release)
+
+    def _in_use(self, typ, release, revision=None) -> bool:
+        return super()._in_use(typ, release, revision) or _release_in_use(Path(self._cache_base_path, typ, release))
+
+
+def _release_in_use(path) -> bool:
+    """Chrome holds `SingletonLock` (a dangling symlink) in its user data directory while running"""
+    profiles = [Path(path, "UserData"), *Path(path).glob("Sessions/*")]
+    return any(os.path.lexists(profile.joinpath("SingletonLock")) for profile in profiles)
 
 
 class BrowserUserDataCache:
-    """Browser User Data Cache"""
+    """Browser User Data Cache
+    - `get` is the release's shared profile, it doubles as the template of clones
+    - `clone` gives a session its own copy of the profile, removed when it ends
+    - `pool` keeps clean clones ready ahead of time
+    """
 
-    def __init__(self, browser_name, base_path=None):
-        self._browser_cache = BrowserCache(browser_name, base_path)
+    def __init__(self, browser_name, base_path=None, **options):
+        self._browser_cache = BrowserCache(browser_name, base_path, **options)
 
     def get(self, release, revision=None):
         browser_path = self._browser_cache.get(release, revision)
@@ -129,3 +629,208 @@ class BrowserUserDataCache:
         user_data_path.mkdir(mode=0o755, exist_ok=True)
         logger.info(f"Got user data {user_data_path} for {self._browser_cache._browser_name}")
         return user_data_path
+
+    @contextmanager
+    def clone(self, release, revision=None):
+        """Yield a private copy of the release's user data, removed on exit"""
+        with self.pool(release, revision, size=0) as pool, pool.session() as path:
+            yield path
+
+    def pool(self, release, revision=None, size=2):
+        template = self.get(release, revision)
+        return UserDataPool(template, template.parent.joinpath("Sessions"), size)
+
+
+class UserDataPool:
+    """Clean clones of a `template` user data directory, kept `size` ahead in `directory`
+    - clones are made with `clone_tree`: reflinks, else hardlinks for the files chrome
+      never rewrites in place (extensions, dictionaries, components), else copies
+    - `session` hands out a clone, refills the pool in the background and removes the
+      clone when the session ends; `close` (or exit) removes the unused ones
+    """
+
+    def __init__(self, template, directory, size=2):
+        self._template = Path(template)
+        self._directory = Path(directory)
+        self._ready = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="swm-clone")
+        self._finalizer = weakref.finalize(self, _close_pool, self._executor, self._ready)
+        for _ in range(size):
+            self._executor.submit(self._fill)
+
+    def _fill(self):
+        self._ready.put(self._clone())
+
+    def _clone(self) -> Path:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        path = Path(tempfile.mkdtemp(prefix="session-", dir=self._directory))
+        start = time.time()
+        method = clone_tree(self._template, path, link=_immutable_profile_file, exclude=_singleton_file)
+        logger.debug(f"Cloned {self._template} to {path} by {method} in {time.time() - start:.3f}s")
+        return path
+
+    @contextmanager
+    def session(self):
+        """Yield a clean user data directory, removed on exit"""
+        try:
+            path = self._ready.get_nowait()
+            self._executor.submit(self._fill)
+        except queue.Empty:
+            path = self._clone()
+        try:
+            yield path
+        finally:
+            remove_tree(path)
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_IMMUTABLE_PROFILE_FILE = re.compile(r"(^|/)(Extensions|Dictionaries|WidevineCdm|hyphen-data|ZxcvbnData|pnacl)/")
+
+
+def _immutable_profile_file(rel) -> bool:
+    """Chrome installs these as new versioned files, it never writes to them in place"""
+    return bool(_IMMUTABLE_PROFILE_FILE.search(Path(rel).as_posix()))
+
+
+def _singleton_file(rel) -> bool:
+    """Lock, socket and cookie of the running chrome owning the template"""
+    return Path(rel).name.startswith("Singleton")
+
+
+def _close_pool(executor, ready):
+    executor.shutdown(wait=True, cancel_futures=True)
+    while not ready.empty():
+        remove_tree(ready.get_nowait())
+
+
+class ResolutionCache:
+    """Resolved `version -> (release, revision)` lookups, kept next to the cache metadata
+    - entries carry the time they were resolved so callers can apply a TTL
+    """
+
+    def __init__(self, driver_name, base_path=None):
+        self._base_path = Path(base_path or DEFAULT_BASE_PATH).expanduser()
+        self._cache_json_path = self._base_path.joinpath("resolutions.json")
+        self._driver_name = driver_name
+        self._lock = metadata_lock(self._cache_json_path)
+
+    def get(self, version) -> dict:
+        return self._read_metadata().get(self._key(version))
+
+    def put(self, version, release, revision=None) -> dict:
+        """Record a resolution. A driver-only refresh keeps the revision if the release is unchanged"""
+        with self._lock:
+            metadata = self._read_metadata()
+            key = self._key(version)
+            previous = metadata.get(key, {})
+            if revision is None and previous.get("release") == str(release):
+                revision = previous.get("revision")
+            metadata[key] = {
+                "release": str(release),
+                "revision": str(revision) if revision is not None else None,
+                "resolved_at": time.time(),
+            }
+            write_json_atomic(self._cache_json_path, metadata)
+            return metadata[key]
+
+    def items(self) -> dict:
+        """{key: entry} of every resolution, keys as in `resolutions.json`"""
+        return self._read_metadata()
+
+    def merge(self, entries: dict):
+        """Add resolutions of another cache (see `items`), keeping the most recent of each key"""
+        with self._lock:
+            metadata = self._read_metadata()
+            for key, entry in entries.items():
+                if key not in metadata or metadata[key]["resolved_at"] < entry["resolved_at"]:
+                    metadata[key] = entry
+            write_json_atomic(self._cache_json_path, metadata)
+
+    @staticmethod
+    def is_stale(entry: dict, ttl: float) -> bool:
+        return time.time() - entry["resolved_at"] > ttl
+
+    def _key(self, version):
+        return f"{self._driver_name}_{version or 0}"
+
+    def _read_metadata(self):
+        if Path(self._cache_json_path).exists():
+            with open(self._cache_json_path, "r") as outfile:
+                return json.load(outfile)
+        return {}
+
+
+class RevisionIndex:
+    """Sorted chromium snapshot revisions known to exist for one `platform`, in `revisions.json`
+    - `complete` ranges are those whose available revisions are all known (from a bucket
+      listing, or the range a search scanned), so `floor` answers within them without a request
+    - lookups bisect the in-memory lists, loaded once; `add` merges into the file
+    """
+
+    def __init__(self, platform, base_path=None):
+        self._base_path = Path(base_path or DEFAULT_BASE_PATH).expanduser()
+        self._path = self._base_path.joinpath("revisions.json")
+        self._platform = platform
+        self._lock = metadata_lock(self._path)
+        self._available = self._complete = None
+
+    def floor(self, revision: int) -> int:
+        """Highest available revision <= `revision`, None unless a complete range covers it"""
+        self._load()
+        i = bisect.bisect_right(self._complete, [revision, math.inf]) - 1
+        if i < 0 or self._complete[i][1] < revision:
+            return
+        j = bisect.bisect_right(self._available, revision) - 1
+        if j < 0 or self._available[j] < self._complete[i][0]:
+            return
+        return self._available[j]
+
+    def known(self, revision: int) -> bool:
+        """Whether `revision` exists: True/False if known, else None"""
+        self._load()
+        j = bisect.bisect_left(self._available, revision)
+        if j < len(self._available) and self._available[j] == revision:
+            return True
+        i = bisect.bisect_right(self._complete, [revision, math.inf]) - 1
+        if i >= 0 and self._complete[i][1] >= revision:
+            return False
+
+    def add(self, revisions, complete=()):
+        """Record available `revisions`, and that the `complete` (lo, hi) ranges hold no others"""
+        with self._lock:
+            index = self._read()
+            entry = index.get(self._platform, {})
+            available = sorted(set(entry.get("available", [])).union(revisions))
+            ranges = entry.get("complete", []) + [list(r) for r in complete]
+            merged = []
+            for lo, hi in sorted(ranges):
+                if merged and lo <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], hi)
+                else:
+                    merged.append([lo, hi])
+            index[self._platform] = {"available": available, "complete": merged}
+            write_json_atomic(self._path, index)
+            self._available, self._complete = available, merged
+
+    def __len__(self):
+        self._load()
+        return len(self._available)
+
+    def _load(self):
+        if self._available is None:
+            entry = self._read().get(self._platform, {})
+            self._available, self._complete = entry.get("available", []), entry.get("complete", [])
+
+    def _read(self):
+        if not self._path.exists():
+            return {}
+        with open(self._path, "r") as outfile:
+            return json.load(outfile)
@@ -0,0 +1,166 @@
+"""`swm` command line
+
+    swm prefetch 90-96 0 --lockfile swm.lock
+
+resolves and downloads every version concurrently (ie in a Docker build or a CI
+cache-warm step) and pins them in a lockfile for `ChromeDriverManager(lockfile=...)`.
+
+    swm verify
+
+re-hashes every install and removes the corrupt ones, to be fetched again on use.
+
+    swm export swm.tar.gz 90-96
+    swm import swm.tar.gz
+
+packs installed versions into one bundle, and restores it into another cache, see `bundle`.
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+
+from pathlib import Path
+from smart_webdriver_manager.bundle import export_bundle, import_bundle
+from smart_webdriver_manager.context import (
+    LATEST_CACHED,
+    SmartChromeContextManager,
+    is_version_spec,
+    parse_version_spec,
+)
+from smart_webdriver_manager.driver import ChromeDriverManager
+from smart_webdriver_manager.lockfile import read_lockfile, write_lockfile
+from smart_webdriver_manager.metrics import Metrics, subscribe
+from smart_webdriver_manager.utils import UNPACK_WORKERS
+
+from . import logger
+
+
+def parse_versions(specs) -> list:
+    """["90-92", "96", "~95"] -> [90, 91, 92, 96, "~95"] (0 is the latest)
+    Specifiers (ie ">=90,<96", "latest-cached") are kept as is, see `parse_version_spec`
+    """
+    versions = []
+    for spec in specs:
+        if is_version_spec(spec) and not re.fullmatch(r"\d+-\d+", spec):
+            parse_version_spec(spec)
+            versions.append(spec)
+            continue
+        try:
+            if "-" in spec:
+                start, end = (int(v) for v in spec.split("-", 1))
+                if start > end:
+                    raise ValueError
+                versions.extend(range(start, end + 1))
+            else:
+                versions.append(int(spec))
+        except ValueError:
+            raise ValueError(f"Invalid version or range {spec!r}, expected ie 96 or 90-96") from None
+    return list(dict.fromkeys(versions))
+
+
+def prefetch(args):
+    versions = parse_versions(args.versions)
+    metrics = Metrics()
+    unsubscribe = subscribe(metrics)
+    try:
+        installed = ChromeDriverManager.install_many(
+            versions,
+            base_path=args.base_path,
+            max_workers=args.workers,
+            offline=args.offline or None,
+        )
+    finally:
+        unsubscribe()
+        if args.metrics:
+            write_metrics(metrics, args.metrics)
+    if args.lockfile:
+        write_lockfile(args.lockfile, installed, args.base_path)
+        logger.info(f"Wrote {len(installed)} versions to {args.lockfile}")
+    json.dump({str(version): entry for version, entry in installed.items()}, sys.stdout, indent=4)
+    sys.stdout.write("\n")
+
+
+def verify(args):
+    cx = SmartChromeContextManager(args.base_path)
+    corrupt = cx.verify()
+    for key in corrupt:
+        print(f"removed corrupt {'/'.join(k for k in key if k)}")
+    return 1 if corrupt else 0
+
+
+def export(args):
+    cx = SmartChromeContextManager(args.base_path)
+    releases = None
+    if args.lockfile:
+        releases = [(entry["release"], entry["revision"]) for entry in read_lockfile(args.lockfile).values()]
+    if args.versions:
+        releases = releases or []
+        for version in parse_versions(args.versions):
+            spec = version if is_version_spec(version) else f"~{version}" if version else LATEST_CACHED
+            installed = cx.get_installed_release(spec)
+            if not installed:
+                raise ValueError(f"Version {version} is not installed, see `swm prefetch`")
+            releases.append(installed)
+    artifacts = export_bundle(cx, args.bundle, releases and list(dict.fromkeys(releases)))
+    for artifact in artifacts:
+        print(f"exported {artifact['typ']} {artifact['release']} {artifact['revision'] or ''}".rstrip())
+
+
+def import_(args):
+    cx = SmartChromeContextManager(args.base_path)
+    for artifact in import_bundle(cx, args.bundle, max_workers=args.workers):
+        print(f"imported {artifact['typ']} {artifact['release']} {artifact['revision'] or ''}".rstrip())
+
+
+def write_metrics(metrics, path):
+    """Json for `.json` paths, Prometheus text (ie for the node exporter textfile collector) otherwise"""
+    text = metrics.to_json() if Path(path).suffix == ".json" else metrics.to_prometheus()
+    Path(path).write_text(text)
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="swm", description="Smart webdriver manager")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_prefetch = commands.add_parser("prefetch", help="download versions ahead of time")
+    parser_prefetch.add_argument("versions", nargs="+", help="versions, ranges or specifiers, ie 0 96 90-95 '>=90,<96'")
+    parser_prefetch.add_argument("--base-path", help="cache directory")
+    parser_prefetch.add_argument("--workers", type=int, default=4, help="concurrent resolutions/downloads")
+    parser_prefetch.add_argument("--lockfile", help="write the resolved versions to this lockfile")
+    parser_prefetch.add_argument("--offline", action="store_true", help="use cached resolutions only")
+    parser_prefetch.add_argument("--metrics", help="write install timings to this .json or .prom file")
+    parser_prefetch.set_defaults(func=prefetch)
+
+    parser_verify = commands.add_parser("verify", help="re-hash the cache, removing corrupt installs")
+    parser_verify.add_argument("--base-path", help="cache directory")
+    parser_verify.set_defaults(func=verify)
+
+    parser_export = commands.add_parser("export", help="pack installed versions into a bundle")
+    parser_export.add_argument("bundle", help="bundle to write, ie swm.tar.gz (.tar, .tar.xz, .tar.bz2)")
+    parser_export.add_argument("versions", nargs="*", help="installed versions, ranges or specifiers (default all)")
+    parser_export.add_argument("--base-path", help="cache directory")
+    parser_export.add_argument("--lockfile", help="also export the versions pinned in this lockfile")
+    parser_export.set_defaults(func=export)
+
+    parser_import = commands.add_parser("import", help="restore a bundle into the cache")
+    parser_import.add_argument("bundle", help="bundle written by `swm export`")
+    parser_import.add_argument("--base-path", help="cache directory")
+    parser_import.add_argument("--workers", type=int, default=UNPACK_WORKERS, help="threads writing files")
+    parser_import.set_defaults(func=import_)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        return args.func(args) or 0
+    except ValueError as e:
+        logger.error(e)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,138 @@
 import re
-import requests
 import platform
-import backoff
-import json
+import os
+import threading
 
 from abc import ABCMeta, abstractmethod
-from packaging.version import Version, parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from smart_webdriver_manager.cache import (
     DriverCache,
     BrowserCache,
     BrowserUserDataCache,
+    ResolutionCache,
+    RevisionIndex,
     DEFAULT_BASE_PATH,
+    STAGING_GRACE,
 )
-from smart_webdriver_manager.utils import download_file
+from smart_webdriver_manager.metrics import emit, phase
+from smart_webdriver_manager.utils import StreamDigest
 
 from . import logger
 
+if TYPE_CHECKING:
+    from packaging.version import Version
+
+DEFAULT_RESOLUTION_TTL = 24 * 60 * 60
+
+
+def parse(version: str) -> "Version":
+    """`packaging.version.parse`, imported on first use: cached lookups never need it"""
+    from packaging.version import parse
+
+    return parse(version)
+
+
+SEARCH_BATCH = 32  # concurrent probes per round trip, at most
+# about half a milestone (base positions are ~10k revisions apart): a snapshot further
+# below a base position is an older milestone's build
+SEARCH_DEPTH = 5000
+
+
+def search_revision(revision: int, depth: int = SEARCH_DEPTH):
+    """Search for the highest chromium snapshot at or below `revision`
+    - every revision is probed downward, in batches of 1, 2, 4, ... (up to `SEARCH_BATCH`)
+      that can be probed concurrently
+    - the first batch with a hit holds the answer: its highest hit
+    - gives up `depth` revisions below `revision`
+    Snapshots can be missing at any revision, so only a contiguous scan finds the true floor;
+    batching takes it in O(log n) round trips and at most about twice the requests of a
+    one-by-one walk.
+
+    A generator so the probing can be sync or async: it yields batches of candidate revisions
+    (descending), is sent the ones that exist, and returns the revision found.
+    """
+    lowest = max(revision - depth, 1)
+    top, size = revision, 1
+    while top >= lowest:
+        batch = list(range(top, max(top - size, lowest - 1), -1))
+        hits = yield batch
+        if hits:
+            return max(hits)
+        top, size = batch[-1] - 1, min(size * 2, SEARCH_BATCH)
+    raise ValueError(f"There is no chromium snapshot between revisions {lowest} and {revision}")
+
+
+LATEST_CACHED = "latest-cached"
+
+
+def is_version_spec(version) -> bool:
+    """Whether `version` is a specifier (ie ">=90,<96", "~95", "latest-cached") rather than a major"""
+    return not isinstance(version, int) and not str(version).isdigit()
+
+
+# bare majors compare on the major: "<=95" accepts 95.0.4638.69, which PEP 440 puts above 95
+_MAJOR_CLAUSES = {
+    "==": lambda major: f"=={major}.*",
+    "!=": lambda major: f"!={major}.*",
+    "<=": lambda major: f"<{major + 1}",
+    ">": lambda major: f">={major + 1}",
+}
+
+
+def parse_version_spec(version):
+    """`packaging.specifiers.SpecifierSet` matching the releases `version` accepts
+    - "latest-cached" accepts any release, "~95" any 95 release
+    - clauses on a bare major apply to the whole major: "==95" is "~95", "<=95" is "<96"
+    """
+    from packaging.specifiers import InvalidSpecifier, SpecifierSet
+
+    text = str(version).strip()
+    if text == LATEST_CACHED:
+        return SpecifierSet("")
+    if re.fullmatch(r"~\d+", text):
+        major = int(text[1:])
+        return SpecifierSet(f">={major},<{major + 1}")
+    clauses = []
+    for clause in text.split(","):
+        match = re.fullmatch(r"\s*(==|!=|<=|>)\s*(\d+)\s*", clause)
+        clauses.append(_MAJOR_CLAUSES[match[1]](int(match[2])) if match else clause)
+    try:
+        return SpecifierSet(",".join(clauses))
+    except InvalidSpecifier:
+        raise ValueError(f"Invalid version {version!r}, expected ie 96, >=90,<96, ~95 or {LATEST_CACHED}") from None
+
+
+def spec_majors(spec) -> (int, int):
+    """Lowest and highest major versions `spec` can match, None if unbounded"""
+    from packaging.version import Version
+
+    lower = upper = None
+    for s in spec:
+        v = Version(s.version.rstrip(".*"))
+        if s.operator in (">=", ">", "==", "~=", "==="):
+            lower = max(lower or 0, v.major)
+        if s.operator in ("<=", "==", "~=", "==="):
+            upper = min(upper or v.major, v.major)
+        elif s.operator == "<":
+            major = v.major - 1 if not any(v.release[1:]) else v.major
+            upper = min(upper or major, major)
+    return lower, upper
+
+
+def _listed_revisions(prefixes) -> list:
+    """Revisions of bucket listing prefixes like `Linux_x64/929512/`"""
+    return [int(p.rstrip("/").rsplit("/", 1)[-1]) for p in prefixes if p.rstrip("/").rsplit("/", 1)[-1].isdigit()]
+
 
 class SmartContextManager(metaclass=ABCMeta):
-    def __init__(self, browser_name, base_path=None):
+    def __init__(self, browser_name, base_path=None, **cache_options):
         self._base_path = base_path or DEFAULT_BASE_PATH
         self._browser_name = browser_name
         self._driver_name = self._browser_to_driver()
-        self._driver_cache = DriverCache(self._driver_name, base_path)
+        self._driver_cache = DriverCache(self._driver_name, base_path, **cache_options)
 
     @property
     def driver_platform(self):
@@ -39,12 +147,12 @@ class SmartContextManager(metaclass=ABCMeta):
         }.get(platform.system())
 
     @abstractmethod
-    def get_driver_release(self, version: int = 0) -> Version:
+    def get_driver_release(self, version: int = 0) -> "Version":
         """Translate the version to a release"""
         pass
 
     @abstractmethod
-    def get_browser_release(self, version: int = 0) -> (Version, Version):
+    def get_browser_release(self, version: int = 0) -> ("Version", "Version"):
         """Translate the version to a release"""
         pass
 
@@ -74,18 +182,100 @@ class SmartChromeContextManager(SmartContextManager):
     Chromedriver LATEST_RELEASE gives the latest version of Chromedriver, ie 96
     But if downloading Chromium, the latest is 98, not supported by Chromedriver 96
 
-    """
+    Resolutions are cached on disk for `resolution_ttl` seconds. Stale entries are
+    returned immediately and refreshed in the background. With `offline` (or the
+    SWM_OFFLINE environment variable) only cached resolutions are used.
+
+    All requests go through one pooled `session` (see `download.make_session`), which
+    can be injected to tune pooling, timeouts and retries or to point at a stand-in.
+    `requests` and `packaging` are only imported once a request is needed, so answering
+    from the caches (`get_cached_release`, `get_cached`) stays cheap to import and run.
+
+    Other keyword arguments configure the caches, see `SmartCache`: `metadata` selects
+    the metadata backend ("json" or "sqlite"), `dedupe` hardlinks identical files across
+    releases, `max_size`/`max_age` bound the cache by evicting least recently used installs,
+    `extract` selects what is unpacked (ie "headless"), `shared` adds read-only cache tiers.
+
+    Archives are looked up in the local cache, then the `shared` tiers, then fetched from
+    each of the `mirrors` (or SWM_MIRRORS, comma separated) before the origin. Mirrors use
+    the npmmirror layout: `{mirror}/chromedriver/{release}/chromedriver_{platform}.zip` and
+    `{mirror}/chromium-browser-snapshots/{platform}/{revision}/chrome-{platform}.zip`.
+    Releases are still resolved and probed against the origin, whose `url_driver_repo`,
+    `url_browser_repo`, `url_browser_deps` and `url_browser_list` can be overridden.
 
-    def __init__(self, base_path=None):
-        super().__init__("chrome", base_path)
-        self._browser_cache = BrowserCache(self._browser_name, self._base_path)
-        self._browser_user_data_cache = BrowserUserDataCache(self._browser_name, self._base_path)
+    Snapshot revisions found by probing, or listed from the bucket by `refresh_revision_index`,
+    are kept in a per-platform `RevisionIndex`; revisions it covers need no probe.
 
-        self.url_driver_repo = "https://chromedriver.storage.googleapis.com"
+    """
+
+    def __init__(
+        self,
+        base_path=None,
+        probe_counter=None,
+        resolution_ttl=DEFAULT_RESOLUTION_TTL,
+        offline=None,
+        session=None,
+        mirrors=None,
+        url_driver_repo=None,
+        url_browser_repo=None,
+        url_browser_deps=None,
+        url_browser_list=None,
+        **cache_options,
+    ):
+        super().__init__("chrome", base_path, **cache_options)
+        self._owns_session = session is None
+        self._session = session
+        self._probe_counter = probe_counter
+        self._resolution_ttl = resolution_ttl
+        self._offline = bool(os.getenv("SWM_OFFLINE")) if offline is None else offline
+        self._resolution_cache = ResolutionCache(self._driver_name, self._base_path)
+        self._revision_index = RevisionIndex(self.browser_platform, self._base_path)
+        self._revalidating = {}
+        self._revalidating_lock = threading.Lock()
+        self._browser_cache = BrowserCache(self._browser_name, self._base_path, **cache_options)
+        self._browser_user_data_cache = BrowserUserDataCache(self._browser_name, self._base_path, **cache_options)
+
+        if mirrors is None:
+            mirrors = os.getenv("SWM_MIRRORS", "").split(",")
+        self.mirrors = [m.strip().rstrip("/") for m in mirrors if m.strip()]
+
+        self.url_driver_repo = url_driver_repo or "https://chromedriver.storage.googleapis.com"
         self.url_driver_repo_latest = f"{self.url_driver_repo}/LATEST_RELEASE"
+        self.url_browser_deps = url_browser_deps or "https://omahaproxy.appspot.com/deps.json"
 
-        url_browser_repo = "https://www.googleapis.com/download/storage/v1/b/chromium-browser-snapshots/o"
+        url_browser_repo = (
+            url_browser_repo or "https://www.googleapis.com/download/storage/v1/b/chromium-browser-snapshots/o"
+        )
         self.url_browser_zip = f"{url_browser_repo}/{self.browser_platform}%2F{{}}%2Fchrome-{{}}.zip?alt=media"
+        self.url_browser_list = (
+            url_browser_list or "https://www.googleapis.com/storage/v1/b/chromium-browser-snapshots/o"
+        )
+
+    @property
+    def session(self):
+        """Pooled session, created on first use unless injected"""
+        if self._session is None:
+            from smart_webdriver_manager.download import make_session
+
+            self._session = make_session()
+        return self._session
+
+    def close(self):
+        """Close the session unless it was injected"""
+        if self._owns_session and self._session is not None:
+            self._session.close()
+
+    def evict(self, max_size=None, max_age=None) -> list:
+        """Evict least recently used drivers and browsers, `max_size` applies to each cache"""
+        return self._driver_cache.evict(max_size, max_age) + self._browser_cache.evict(max_size, max_age)
+
+    def verify(self) -> list:
+        """Re-hash every driver and browser, corrupt ones are removed (fetched again on use)"""
+        return self._driver_cache.verify_all() + self._browser_cache.verify_all()
+
+    def collect_garbage(self, grace=STAGING_GRACE) -> int:
+        """Remove leftovers of interrupted installs from both caches, returns the bytes freed"""
+        return self._driver_cache.collect_garbage(grace) + self._browser_cache.collect_garbage(grace)
 
     def browser_zip(self, revision: str):
         win = lambda x: "win" if x > 591479 else "win32"  # naming changes (roughly v70)
@@ -95,80 +285,331 @@ class SmartChromeContextManager(SmartContextManager):
             "Darwin": "mac",
         }.get(platform.system())
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=30)
-    def get_driver_release(self, version: int = 0) -> Version:
+    def driver_url(self, release: str) -> str:
+        return f"{self.url_driver_repo}/{release}/chromedriver_{self.driver_platform}.zip"
+
+    def browser_url(self, revision: str) -> str:
+        return self.url_browser_zip.format(revision, self.browser_zip(revision))
+
+    def driver_urls(self, release: str) -> list:
+        """Where to download a driver from, mirrors first"""
+        name = f"chromedriver_{self.driver_platform}.zip"
+        return [f"{mirror}/chromedriver/{release}/{name}" for mirror in self.mirrors] + [self.driver_url(release)]
+
+    def browser_urls(self, revision: str) -> list:
+        """Where to download a browser from, mirrors first"""
+        name = f"chrome-{self.browser_zip(revision)}.zip"
+        return [
+            f"{mirror}/chromium-browser-snapshots/{self.browser_platform}/{revision}/{name}" for mirror in self.mirrors
+        ] + [self.browser_url(revision)]
+
+    def _run(self, plan):
+        """Run a resolution `plan` to its return value
+        Plans are generators shared with the asyncio manager: they yield `(fn, *args)` steps
+        for anything doing I/O and are sent each result (or thrown its exception). Here steps
+        are plain calls; `AsyncSmartChromeContextManager` awaits coroutine steps and runs the
+        others in its executor.
+        """
+        result = error = None
+        while True:
+            try:
+                fn, *args = plan.throw(error) if error is not None else plan.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, e
+
+    def get_driver_release(self, version: int = 0) -> "Version":
         """Find the latest driver version corresponding to the browser release"""
-        logger.debug(f"Getting {self._driver_name} version for {version}")
-        _version = f"_{version}" if version else ""
-        url = f"{self.url_driver_repo_latest}{_version}"
-        resp = requests.get(url)
-        if resp.status_code == 404:
-            raise ValueError(f"There is no driver for version {version}")
-        elif resp.status_code != 200:
-            raise ValueError(
-                f"response body:\n{resp.json()}\n"
-                f"request url:\n{resp.request.url}\n"
-                f"response headers:\n{dict(resp.headers)}\n"
-            )
-        return parse(resp.text.rstrip())
-
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=30)
-    def get_browser_release(self, version: int = 0) -> (Version, Version):
+        return self._run(self._driver_release(version))
+
+    def _driver_release(self, version):
+        if is_version_spec(version):
+            return (yield from self._browser_release(version))[0]
+        entry = yield from self._resolution(version)
+        if entry:
+            return parse(entry["release"])
+        release = yield self._fetch_driver_release, version
+        yield self._resolution_cache.put, version, release
+        return release
+
+    def get_browser_release(self, version: int = 0) -> ("Version", "Version"):
         """Find latest corresponding chromium relese to specified/latest chromedriver
         - If the browser does not have an associated driver (revision version too high),
-          this will iterate down to the latest supported browser
+          this will search down to the latest supported browser
+        - a version specifier is resolved by `resolve_version_spec`
         """
-        url_repo = "https://omahaproxy.appspot.com"
-        release = self.get_driver_release(version)
-        revision_url = f"{url_repo}/deps.json?version={str(release)}"
-        revision = int(json.loads(requests.get(revision_url).content.decode())["chromium_base_position"])
+        return self._run(self._browser_release(version))
+
+    def _browser_release(self, version):
+        if is_version_spec(version):
+            return (yield from self._spec_release(version))
+        entry = yield from self._resolution(version, browser=True)
+        if entry:
+            return parse(entry["release"]), parse(entry["revision"])
+        release = yield from self._driver_release(version)
+        revision = yield from self._browser_revision(release)
+        yield self._resolution_cache.put, version, release, revision
+        logger.debug(f"Chromedriver version {version} supports chromium {release=} {revision=}")
+        return release, parse(str(revision))
 
+    def resolve_version_spec(self, version: str) -> ("Version", "Version"):
+        """Latest release (and its latest revision) satisfying the specifier `version`
+        - installed releases first, see `get_installed_release`
+        - else the highest major within the specifier's bounds whose release satisfies it
+          (a `get_driver_release` each, and those are cached)
+        """
+        return self._run(self._spec_release(version))
+
+    def _spec_release(self, version):
+        spec = parse_version_spec(version)
+        installed = yield self.get_installed_release, version
+        if installed:
+            return parse(installed[0]), parse(installed[1])
+        lower, upper = spec_majors(spec)
+        if upper is None:
+            upper = (yield from self._driver_release(0)).major
+        for major in range(upper, (lower or 1) - 1, -1):
+            try:
+                release = yield from self._driver_release(major)
+            except ValueError as e:
+                logger.debug(f"Skipping version {major}: {e}")
+                continue
+            if spec.contains(release):
+                return (yield from self._browser_release(major))
+        raise ValueError(f"There is no release satisfying {version!r}")
+
+    def get_installed_releases(self) -> list:
+        """(release, revision) pairs with both driver and browser in the cache. Makes no request"""
+        drivers = set(self._driver_cache.releases())
+        return [
+            (release, revision)
+            for release, revision in self._browser_cache.revisions()
+            if release in drivers and revision
+        ]
+
+    def get_installed_release(self, version: str) -> (str, str):
+        """Latest release and revision with both driver and browser in the cache satisfying the
+        specifier `version`, else None. Makes no request
+        """
+        spec = parse_version_spec(version)
+        matching = [pair for pair in self.get_installed_releases() if spec.contains(pair[0])]
+        if matching:
+            return max(matching, key=lambda m: (parse(m[0]), int(m[1])))
+
+    def get_cached_release(self, version: int = 0) -> (str, str):
+        """Release and revision of a cached browser resolution that needs no refresh, else None
+        A version specifier is matched against installed releases, see `get_installed_release`
+        """
+        if is_version_spec(version):
+            return self.get_installed_release(version)
+        entry = self._resolution_cache.get(version)
+        if not entry or not entry["revision"]:
+            return
+        if not self._offline and self._resolution_cache.is_stale(entry, self._resolution_ttl):
+            return
+        emit("cache", cache="resolutions", hit=True)
+        return entry["release"], entry["revision"]
+
+    def get_cached(self, release: str, revision: str) -> (Path, Path):
+        """Driver and browser paths if both are installed, else None. Makes no request"""
+        driver = self._driver_cache.get(release)
+        browser = driver and self._browser_cache.get(release, revision)
+        if not browser:
+            return
+        emit("cache", cache=self._driver_cache.name, hit=True)
+        emit("cache", cache=self._browser_cache.name, hit=True)
+        return driver, browser
+
+    def _resolution(self, version, browser=False):
+        """Cached resolution for `version`, revalidated in the background when stale"""
+        entry = yield self._cached_resolution, version, browser
+        if entry and not self._offline and self._resolution_cache.is_stale(entry, self._resolution_ttl):
+            yield self._revalidate, version, bool(entry["revision"])
+        return entry
+
+    def _cached_resolution(self, version, browser=False) -> dict:
+        entry = self._resolution_cache.get(version)
+        hit = bool(entry and (entry["revision"] or not browser))
+        emit("cache", cache="resolutions", hit=hit)
+        if hit:
+            logger.debug(f"Using cached resolution for version {version}: {entry}")
+            return entry
+        if self._offline:
+            raise ValueError(f"There is no cached resolution for version {version} in offline mode")
+
+    def _refresh(self, version, browser=False):
+        release = yield self._fetch_driver_release, version
+        revision = (yield from self._browser_revision(release)) if browser else None
+        yield self._resolution_cache.put, version, release, revision
+
+    def _revalidate(self, version, browser=False):
+        """Refresh a stale resolution on a background thread (one per version)"""
+
+        def refresh():
+            try:
+                self._run(self._refresh(version, browser))
+            except Exception as e:
+                logger.warning(f"Failed to refresh resolution for version {version}: {e}")
+
+        with self._revalidating_lock:
+            thread = self._revalidating.get(version)
+            if thread and thread.is_alive():
+                return
+            thread = threading.Thread(target=refresh, daemon=True)
+            self._revalidating[version] = thread
+            thread.start()
+
+    def _fetch_driver_release(self, version: int = 0) -> "Version":
+        logger.debug(f"Getting {self._driver_name} version for {version}")
+        _version = f"_{version}" if version else ""
+        url = f"{self.url_driver_repo_latest}{_version}"
+        with phase("resolve_release", version=version):
+            resp = self.session.get(url)
+            if resp.status_code == 404:
+                raise ValueError(f"There is no driver for version {version}")
+            elif resp.status_code != 200:
+                raise ValueError(
+                    f"response body:\n{resp.json()}\n"
+                    f"request url:\n{resp.request.url}\n"
+                    f"response headers:\n{dict(resp.headers)}\n"
+                )
+            return parse(resp.text.rstrip())
+
+    def _fetch_browser_position(self, release: "Version") -> int:
+        with phase("lookup_position", release=str(release)):
+            resp = self.session.get(f"{self.url_browser_deps}?version={str(release)}")
+            resp.raise_for_status()
+            return int(resp.json()["chromium_base_position"])
+
+    def _browser_revision(self, release):
+        position = yield self._fetch_browser_position, release
+        with phase("probe_revisions", release=str(release), position=position):
+            return (yield from self._find_revision(position))
+
+    def find_browser_revision(self, revision: int) -> int:
+        """Find an available chromium snapshot at or below `revision`
+        - answered by the revision index if it covers `revision`
+        - else probed, see `search_revision`; the probed range is recorded in the index
+        """
+        return self._run(self._find_revision(revision))
+
+    def _find_revision(self, revision):
+        indexed = yield self._revision_index.floor, revision
+        if indexed is not None:
+            logger.debug(f"Revision index has {indexed} for {revision}")
+            return indexed
+        search, found, lowest = search_revision(revision), [], revision + 1
+        result = error = None
+        try:
+            batch = next(search)
+            while True:
+                probes = yield self._probe_browsers, batch
+                hits = [candidate for candidate, hit in zip(batch, probes) if hit]
+                found, lowest = found + hits, batch[-1]
+                batch = search.send(hits)
+        except StopIteration as stop:
+            result = stop.value
+        except Exception as e:
+            error = e
+        # every revision from the lowest probed one up was checked
+        if lowest <= revision:
+            yield self._revision_index.add, found, [(lowest, revision)]
+        if error is not None:
+            raise error
+        return result
+
+    def refresh_revision_index(self) -> int:
+        """List the bucket's snapshots for this platform into the revision index, returns how many"""
+        return self._run(self._refresh_revision_index())
+
+    def _refresh_revision_index(self):
+        revisions, token = [], None
         while True:
-            logger.debug(f"Trying revision {revision} ... ")
-            browser_zip = self.browser_zip(revision)
-            url_browser_zip = self.url_browser_zip.format(revision, browser_zip)
-            status_code = requests.get(url_browser_zip).status_code
-            if status_code == 200:
+            page = yield self._fetch_listing, token
+            revisions += _listed_revisions(page.get("prefixes", []))
+            token = page.get("nextPageToken")
+            if not token:
                 break
-            revision -= 1
-
-        logger.debug(f"Chromedriver version {version} supports chromium {release=} {revision=}")
-        return release, parse(str(revision))
+        if revisions:
+            yield self._revision_index.add, revisions, [(0, max(revisions))]
+        logger.info(f"Listed {len(revisions)} {self.browser_platform} snapshots")
+        return len(revisions)
+
+    def _fetch_listing(self, token=None) -> dict:
+        """A page of the bucket listing of this platform's snapshots"""
+        params = {"delimiter": "/", "prefix": f"{self.browser_platform}/", "fields": "prefixes,nextPageToken"}
+        if token:
+            params["pageToken"] = token
+        resp = self.session.get(self.url_browser_list, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _probe_browsers(self, revisions: list) -> list:
+        """Whether each of `revisions` has a snapshot, probed concurrently"""
+        if len(revisions) == 1:
+            return [self._probe_browser(revisions[0])]
+        with ThreadPoolExecutor(len(revisions), thread_name_prefix="swm-probe") as executor:
+            return list(executor.map(self._probe_browser, revisions))
+
+    def _probe_browser(self, revision: int) -> bool:
+        """HEAD probe for a chromium snapshot zip, unless the revision index knows"""
+        known = self._revision_index.known(revision)
+        if known is not None:
+            return known
+        logger.debug(f"Trying revision {revision} ... ")
+        url = self.browser_url(revision)
+        if self._probe_counter:
+            self._probe_counter(url)
+        found = self.session.head(url, allow_redirects=True).status_code == 200
+        emit("probe", revision=revision, found=found)
+        return found
 
     def get_driver(self, release: str) -> Path:
         """Get driver zip for version"""
-        binary_path = self._driver_cache.get(release)
-        if binary_path:
-            logger.debug(f"Already have latest version for release {release}")
-            return binary_path
-
-        zip_file = f"chromedriver_{self.driver_platform}.zip"
-        url_zip = f"{self.url_driver_repo}/{release}/{zip_file}"
-        logger.debug(f"Getting {zip_file} from {url_zip}")
-
-        with download_file(url_zip) as f:
-            binary_path = self._driver_cache.put(f, release)
-            logger.debug(f"Downloaded {zip_file}")
-
-        return binary_path
+        return self._install(self._driver_cache, self.driver_urls(release), release)
 
     def get_browser(self, release: str, revision: str = None) -> Path:
         """An extension of `get_supported_chromium_revision`"""
-        binary_path = self._browser_cache.get(release, revision)
+        return self._install(self._browser_cache, self.browser_urls(revision), release, revision)
+
+    def _install(self, cache, urls, *key) -> Path:
+        """Download into `cache` unless present. The artifact lock makes concurrent
+        installs (threads or processes) wait for one download instead of repeating it
+        - a copy in a shared tier is promoted instead of downloading
+        - otherwise `urls` are tried in order until one succeeds
+        """
+        binary_path = cache.get(*key)
+        emit("cache", cache=cache.name, hit=bool(binary_path))
         if binary_path:
-            logger.debug(f"Already have latest version for {release=} {revision=}")
+            logger.debug(f"Already have latest version for {key}")
             return binary_path
 
-        browser_zip = self.browser_zip(revision)
-        zip_file = f"{revision}-chrome-{browser_zip}.zip"
-        url_zip = self.url_browser_zip.format(revision, browser_zip)
-        logger.debug(f"Getting {zip_file} from {url_zip}")
-
-        with download_file(url_zip) as f:
-            binary_path = self._browser_cache.put(f, release, revision)
-            logger.debug(f"Downloaded {zip_file}")
-
-        return binary_path
+        with cache.lock(*key):
+            binary_path = cache.get(*key)
+            if binary_path:
+                logger.debug(f"Installed concurrently {key}")
+                return binary_path
+            binary_path = cache.promote(*key)
+            if binary_path:
+                return binary_path
+
+            import requests
+            from smart_webdriver_manager.download import download_file
+
+            for url in urls:
+                logger.debug(f"Getting {url}")
+                digest = StreamDigest()
+                try:
+                    with cache.staging(*key) as staging, download_file(url, self.session, staging, digest=digest) as f:
+                        logger.debug(f"Downloaded {f.name}")
+                        return cache.put(f, *key, digest=digest.hexdigest())
+                except requests.exceptions.RequestException as e:
+                    if url == urls[-1]:
+                        raise
+                    logger.warning(f"Failed to get {url} ({e}), trying the next source")
 
     def get_browser_user_data(self, release: str, revision: str) -> Path:
         """Get browser user data dir that matches release version
@@ -177,3 +618,34 @@ class SmartChromeContextManager(SmartContextManager):
         data_dir_path = self._browser_user_data_cache.get(release, revision)
 
         return str(data_dir_path)
+
+    def get_browser_user_data_pool(self, release: str, revision: str, size: int = 2):
+        """Pool of per-session clones of the release's user data dir, see `UserDataPool`"""
+        return self._browser_user_data_cache.pool(release, revision, size)
+
+    def remove_installed(self, release: str, revision: str) -> bool:
+        """Delete the driver and browser of a release/revision from the cache, both or neither
+        Nothing is deleted (False) while either is in use, ie a running browser or a service pool.
+        """
+        with self._driver_cache.removal(release) as driver, self._browser_cache.removal(release, revision) as browser:
+            if not driver or not browser:
+                logger.info(f"Not removing release {release} revision {revision}, it is in use")
+                return False
+            driver()
+            browser()
+            return True
+
+    def get_installed(self, release: str, revision: str) -> dict:
+        """Paths and archive hashes of an installed release/revision, as written to lockfiles"""
+        driver, browser = self._driver_cache.entry(release), self._browser_cache.entry(release, revision)
+        if not driver or not browser:
+            raise ValueError(f"Release {release} revision {revision} is not installed")
+        return {
+            "release": release,
+            "revision": revision,
+            "driver": driver["binary_path"],
+            "browser": browser["binary_path"],
+            "user_data": self.get_browser_user_data(release, revision),
+            "driver_hash": driver.get("hash"),
+            "browser_hash": browser.get("hash"),
+        }
@@ -0,0 +1,165 @@
+"""HTTP side of the installs: the pooled session and resumable, ranged downloads
+
+Kept apart from `utils` so that cached lookups never import `requests`.
+"""
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse, unquote
+from pathlib import Path
+from smart_webdriver_manager.metrics import emit, phase
+from smart_webdriver_manager.utils import StreamDigest, mktempdir
+
+from . import logger
+
+
+class SmartSession(requests.Session):
+    """Session with a default timeout, see `make_session`"""
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_session(pool_size=10, retries=5, backoff_factor=0.5, timeout=(10, 60)) -> SmartSession:
+    """Pooled keep-alive session shared by release lookups, probes and downloads
+    - `pool_size`: connections kept alive per host
+    - `retries`: connection errors and 429/5xx responses, with exponential `backoff_factor`
+    - `timeout`: default (connect, read) timeout in seconds
+    """
+    session = SmartSession(timeout)
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+RANGE_PART_SIZE = 16 * 1024 * 1024
+RESUME_ATTEMPTS = 5
+RESTART_ATTEMPTS = 3
+_RESUMABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+
+class RangeNotSatisfied(Exception):
+    """Server ignored a Range request"""
+
+
+@contextmanager
+def download_file(url, session=None, directory=None, part_size=RANGE_PART_SIZE, max_workers=4, digest=None) -> Path:
+    """Better download
+    - uses `session` if given (left open), otherwise a one-off session
+    - saves into `directory` if given (left in place), otherwise a temp directory
+    - if the server accepts ranges, files of at least two `part_size` parts are fetched
+      as parallel Range requests, and dropped connections resume where they stopped
+    - otherwise a dropped connection restarts the download, at most `RESTART_ATTEMPTS` times
+    - `digest` (a `StreamDigest`) hashes the file as it downloads
+    """
+    name = Path(urlparse(unquote(url)).path).name
+    tmpdir = nullcontext(Path(directory)) if directory else mktempdir()
+    with tmpdir as tmpdir, (nullcontext(session) if session else make_session()) as session:
+        save_path = tmpdir.joinpath(name)
+        digest = digest or StreamDigest()
+        digest.begin(save_path)
+        start = time.perf_counter()
+        with phase("download", url=url):
+            with session.head(url, allow_redirects=True) as head:
+                ranges = head.ok and head.headers.get("Accept-Ranges") == "bytes"
+                length = int(head.headers.get("Content-Length") or 0)
+            if ranges and length >= 2 * part_size:
+                try:
+                    _download_parts(session, url, save_path, length, part_size, max_workers, digest)
+                except RangeNotSatisfied:
+                    logger.debug(f"Range requests ignored for {url}, falling back to a single stream")
+                    digest.begin(save_path)
+                    _download_stream(session, url, save_path, False, digest)
+            else:
+                _download_stream(session, url, save_path, ranges, digest)
+        emit("download", url=url, bytes=save_path.stat().st_size, seconds=time.perf_counter() - start)
+        yield save_path
+
+
+def _download_stream(session, url, save_path, resumable, digest):
+    """Single GET, resumed with a Range request after a dropped connection if `resumable`,
+    else restarted from the first byte
+    """
+    attempts = RESUME_ATTEMPTS if resumable else RESTART_ATTEMPTS
+    with open(save_path, "wb") as f:
+        for attempt in range(attempts):
+            offset = f.tell()
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with session.get(url, stream=True, headers=headers) as r:
+                    r.raise_for_status()
+                    if offset and r.status_code != 206:
+                        f.seek(0)
+                        f.truncate()
+                        offset = 0
+                        digest.begin(save_path)
+                    length = r.headers.get("Content-Length")
+                    expected = offset + int(length) if length else None
+                    for chunk in r.iter_content(1024 * 1024):
+                        position = f.tell()
+                        f.write(chunk)
+                        digest.write(0, position, chunk)
+                if expected is not None and f.tell() < expected:
+                    raise requests.exceptions.ConnectionError(f"Got {f.tell()} of {expected} bytes")
+                return
+            except _RESUMABLE_ERRORS as e:
+                if attempt == attempts - 1:
+                    raise
+                if resumable:
+                    logger.debug(f"Resuming {url} at byte {f.tell()} after {e}")
+                    continue
+                logger.debug(f"Restarting {url} after {e}")
+                f.seek(0)
+                f.truncate()
+                digest.begin(save_path)
+
+
+def _download_parts(session, url, save_path, length, part_size, max_workers, digest):
+    """Parallel Range requests into a preallocated file, each part resumable"""
+    with open(save_path, "wb") as f:
+        f.truncate(length)
+
+    def download_part(start, end):
+        offset = start
+        with open(save_path, "r+b") as f:
+            for attempt in range(RESUME_ATTEMPTS):
+                try:
+                    with session.get(url, stream=True, headers={"Range": f"bytes={offset}-{end}"}) as r:
+                        r.raise_for_status()
+                        if r.status_code != 206:
+                            raise RangeNotSatisfied(url)
+                        f.seek(offset)
+                        for chunk in r.iter_content(1024 * 1024):
+                            f.write(chunk)
+                            f.flush()
+                            digest.write(start, offset, chunk)
+                            offset += len(chunk)
+                    if offset > end:
+                        return
+                    raise requests.exceptions.ConnectionError(f"Got bytes {start}-{offset - 1} of {start}-{end}")
+                except _RESUMABLE_ERRORS as e:
+                    if attempt == RESUME_ATTEMPTS - 1:
+                        raise
+                    logger.debug(f"Resuming {url} part at byte {offset} after {e}")
+
+    parts = [(start, min(start + part_size, length) - 1) for start in range(0, length, part_size)]
+    logger.debug(f"Downloading {url} in {len(parts)} parts")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swm-download") as executor:
+        for future in [executor.submit(download_part, *part) for part in parts]:
+            future.result()
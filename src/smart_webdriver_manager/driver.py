@@ -1,11 +1,38 @@
+import os
+import threading
+
 from abc import ABCMeta, abstractmethod
-from functools import cache
 
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+from smart_webdriver_manager.cache import DEFAULT_BASE_PATH
 from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.lockfile import read_lockfile
+from smart_webdriver_manager.utils import SingleFlight
 
 from . import logger
 
 
+# (release, revision, driver future, browser future) of every version installed in the process
+INSTALLS = SingleFlight()
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _usable(install) -> bool:
+    """Downloads still running, or finished with paths that still exist"""
+    for future in install[2:]:
+        if future.done() and (future.exception() or not os.path.exists(future.result())):
+            return False
+    return True
+
+
 class DriverManager(metaclass=ABCMeta):
     def __init__(self, version, base_path):
         self._base_path = base_path
@@ -24,68 +51,165 @@ class DriverManager(metaclass=ABCMeta):
     def get_browser_user_data(self) -> str:
         pass
 
-    # @abstractmethod
-    # def remove():
-    # pass
+    @abstractmethod
+    def remove(self) -> bool:
+        """Forget the version's installs and delete them from the cache"""
+        pass
 
 
 class ChromeDriverManager(DriverManager):
-
-    __called_driver__ = False
-    __called_browser__ = False
-
-    def __init__(self, version: int = 0, base_path=None):
+    """Installs a version-synchronized chromedriver, chromium and user data directory
+    - resolution happens once per process (see `INSTALLS`), then the driver and browser
+      are fetched and unpacked in parallel; every getter of every manager of the same
+      version and cache waits on the shared futures, until `invalidate` or `remove`
+    - versions pinned in `lockfile` (or SWM_LOCKFILE, see `swm prefetch`) skip resolution
+    - a pinned or freshly resolved version already in the cache is answered from the
+      cache metadata alone, without importing the network stack
+    - `version` is a major (0 is the latest) or a specifier: ">=90,<96", "~95" or
+      "latest-cached", matched against installed releases before any lookup
+    """
+
+    def __init__(self, version: int = 0, base_path=None, lockfile=None, **kwargs):
+        """Extra keyword arguments (ie `offline`, `resolution_ttl`) configure the
+        `SmartChromeContextManager`
+        """
         super().__init__(version, base_path)
-        self._cx = SmartChromeContextManager(self._base_path)
+        self._lockfile = lockfile or os.getenv("SWM_LOCKFILE")
+        self._cx = SmartChromeContextManager(self._base_path, **kwargs)
+        self._key = (
+            str(Path(base_path or DEFAULT_BASE_PATH).expanduser().absolute()),
+            str(version),
+            self._lockfile,
+            tuple(sorted((k, repr(v)) for k, v in kwargs.items())),
+        )
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _pinned(self):
+        """Release and revision known without a request: from the lockfile or a fresh resolution"""
+        if self._lockfile:
+            entry = read_lockfile(self._lockfile).get(str(self._version))
+            if entry:
+                logger.debug(f"Version {self._version} pinned by {self._lockfile}")
+                return entry["release"], entry["revision"]
+            logger.info(f"Version {self._version} is not in {self._lockfile}, resolving it")
+        return self._cx.get_cached_release(self._version)
+
+    def _install(self):
+        return INSTALLS.do(self._key, self._resolve_and_fetch, valid=_usable)
+
+    def _resolve_and_fetch(self):
+        pinned = self._pinned()
+        if pinned:
+            cached = self._cx.get_cached(*pinned)
+            if cached:
+                return (*pinned, *map(_done, cached))
+        release, revision = pinned or self._cx.get_browser_release(self._version)
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="swm-install")
+        driver = executor.submit(self._cx.get_driver, str(release))
+        browser = executor.submit(self._cx.get_browser, str(release), str(revision))
+        executor.shutdown(wait=False)
+        return release, revision, driver, browser
 
-    @cache
     def get_driver(self):
         """Smart lookup for current driver version
         - chromedriver version will always be <= latest chromium browser
         """
-        driver_release = self._cx.get_driver_release(self._version)
-        driver_path = self._cx.get_driver(str(driver_release))
-        self.__called_driver__ = True
-        if not self.__called_browser__:
-            self.get_browser()
-        return str(driver_path)
-
-    @cache
-    def _get_browser_helper(self):
-        if not self.__called_driver__:
-            self.get_driver()
-        return self._cx.get_browser_release(self._version)
-
-    @cache
+        _, _, driver, _ = self._install()
+        return str(driver.result())
+
     def get_browser(self):
-        self.__called_browser__ = True
-        browser_release, browser_revision = self._get_browser_helper()
-        browser_path = self._cx.get_browser(str(browser_release), str(browser_revision))
-        return str(browser_path)
+        _, _, _, browser = self._install()
+        return str(browser.result())
 
-    @cache
     def get_browser_user_data(self):
-        if not self.__called_browser__:
-            self.get_browser()
-        browser_release, browser_revision = self._get_browser_helper()
+        browser_release, browser_revision, _, browser = self._install()
+        browser.result()
         user_data_path = self._cx.get_browser_user_data(str(browser_release), str(browser_revision))
         return str(user_data_path)
 
-    # def _forfun(self):
-        # # test and remove me
-        # return [
-            # f'driver stats:  {self.get_driver.cache_info()}',
-            # f'browser stats: {self.get_browser.cache_info()}',
-            # f'datadir stats: {self.get_user_data.cache_info()}',
-            # ]
-
-    # def remove(self):
-        # """Needs to remove all the instances from cache (force kill if running)
-        # """
-        # self.get_driver.cache_clear()
-        # self.get_browser.cache_clear()
-        # self.get_user_data.cache_clear()
-        # self._get_browser_helper.cache_clear()
-        # self.__called_driver__ = False
-        # self.__called_browser__ = False
-        # # now remove things
+    def _browser_user_data_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                browser_release, browser_revision, _, browser = self._install()
+                browser.result()
+                self._pool = self._cx.get_browser_user_data_pool(str(browser_release), str(browser_revision))
+            return self._pool
+
+    def invalidate(self) -> bool:
+        """Forget the process-wide resolution of this version, the next getter resolves again"""
+        return INSTALLS.forget(self._key)
+
+    def remove(self) -> bool:
+        """Forget this version and delete its driver and browser from the cache
+        - managers of the version resolve and download again on next use
+        - nothing is deleted (False) while the driver or browser is in use, see `remove_installed`
+        """
+        install = INSTALLS.peek(self._key)
+        self.invalidate()
+        pinned = install[:2] if install else self._pinned()
+        if not pinned:
+            return False
+        release, revision = (str(v) for v in pinned)
+        with self._pool_lock:
+            self._pool = None
+        return self._cx.remove_installed(release, revision)
+
+    @contextmanager
+    def clone_browser_user_data(self):
+        """Private copy of the user data dir for one browser session, removed on exit
+        - parallel sessions of one release no longer share (and lock) a profile
+        - clones of the shared dir are prepared ahead, see `UserDataPool`
+        """
+        with self._browser_user_data_pool().session() as path:
+            yield str(path)
+
+    def driver_service_pool(self, size=2, max_sessions=None, args=()):
+        """`size` chromedriver processes of this version, started ahead and leased per test
+        - services are restarted after `max_sessions` leases or when unhealthy
+        - `args` are extra chromedriver arguments; close the pool (or use it with `with`)
+        - the driver is kept in the cache (not evicted nor removed) until the pool is closed
+        See `service.DriverServicePool`.
+        """
+        from smart_webdriver_manager.service import DriverServicePool
+
+        release, _, _, _ = self._install()
+        hold = self._cx._driver_cache.use(str(release))
+        try:
+            return DriverServicePool(self.get_driver(), size, max_sessions, args, hold=hold)
+        except BaseException:
+            hold.release()
+            raise
+
+    @classmethod
+    def install_many(cls, versions, base_path=None, max_workers=4, **kwargs) -> dict:
+        """Install several versions with one shared context
+        - versions that resolve to the same release/revision are downloaded once
+        - a release's downloads start as soon as one of its versions resolves, while the
+          other versions are still resolving
+        - at most `max_workers` resolutions/downloads run at a time
+        Returns {version: {"driver": path, "browser": path, "user_data": path, ...}}
+        with the release, revision and archive hashes, see `write_lockfile`
+        """
+        versions = list(dict.fromkeys(versions))
+        cx = SmartChromeContextManager(base_path, **kwargs)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swm-install") as executor:
+                resolving = {executor.submit(cx.get_browser_release, version): version for version in versions}
+                resolved, drivers, browsers = {}, {}, {}
+                for future in as_completed(resolving):
+                    release, revision = resolved[resolving[future]] = future.result()
+                    if release not in drivers:
+                        drivers[release] = executor.submit(cx.get_driver, str(release))
+                    if (release, revision) not in browsers:
+                        browsers[release, revision] = executor.submit(cx.get_browser, str(release), str(revision))
+                logger.info(f"Installing {len(browsers)} releases for {len(versions)} versions")
+                installed = {}
+                for version in versions:
+                    release, revision = resolved[version]
+                    drivers[release].result()
+                    browsers[release, revision].result()
+                    installed[version] = cx.get_installed(str(release), str(revision))
+                return installed
+        finally:
+            cx.close()
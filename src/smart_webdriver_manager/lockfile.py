@@ -0,0 +1,33 @@
+import json
+import platform
+
+from pathlib import Path
+from smart_webdriver_manager.utils import write_json_atomic
+
+LOCKFILE_VERSION = 1
+
+
+def write_lockfile(path, installed: dict, base_path=None):
+    """Write `{version: entry}` (see `ChromeDriverManager.install_many`) to `path`
+    - entries pin release and revision, and record the installed paths and archive hashes
+    """
+    write_json_atomic(
+        path,
+        {
+            "lockfile_version": LOCKFILE_VERSION,
+            "platform": platform.system(),
+            "base_path": str(base_path) if base_path else None,
+            "versions": {str(version): entry for version, entry in installed.items()},
+        },
+    )
+
+
+def read_lockfile(path) -> dict:
+    """Read the `{version: entry}` of a lockfile, checking it was written for this platform"""
+    with open(Path(path).expanduser(), "r") as infile:
+        lock = json.load(infile)
+    if lock.get("lockfile_version") != LOCKFILE_VERSION:
+        raise ValueError(f"Unsupported lockfile version {lock.get('lockfile_version')} in {path}")
+    if lock.get("platform") != platform.system():
+        raise ValueError(f"Lockfile {path} was written on {lock.get('platform')}, not {platform.system()}")
+    return lock["versions"]
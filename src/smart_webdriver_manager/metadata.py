@@ -0,0 +1,278 @@
+import json
+import sqlite3
+import threading
+
+from abc import ABCMeta, abstractmethod
+from pathlib import Path
+from smart_webdriver_manager.utils import FileLock, write_json_atomic
+
+from . import logger
+
+
+FIELDS = ("binary_path", "timestamp", "size", "last_access", "hash", "tree_hash", "fingerprint")
+
+_metadata_locks = {}
+_metadata_locks_guard = threading.Lock()
+
+
+class MetadataLock:
+    """Reentrant lock for read-modify-write of a metadata file
+    - an in-process RLock, plus a cross-process `FileLock` held while any thread owns it
+    """
+
+    def __init__(self, path):
+        self._rlock = threading.RLock()
+        self._file_lock = FileLock(f"{path}.lock")
+        self._depth = 0
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            self._file_lock.acquire()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self._file_lock.release()
+        self._rlock.release()
+
+
+def metadata_lock(path) -> MetadataLock:
+    """Lock shared by every cache object in the process writing the metadata at `path`"""
+    with _metadata_locks_guard:
+        path = str(Path(path).expanduser().absolute())
+        if path not in _metadata_locks:
+            _metadata_locks[path] = MetadataLock(path)
+        return _metadata_locks[path]
+
+
+def metadata_key(typ, release, revision=None) -> str:
+    return f"{typ}_{release}{'_' if revision else ''}{revision or ''}"
+
+
+class MetadataStore(metaclass=ABCMeta):
+    """Metadata backend of a `SmartCache`, one entry per typ/release/revision
+    Entries are dicts of `FIELDS`; only `binary_path` is required.
+    """
+
+    @abstractmethod
+    def get(self, typ, release, revision=None) -> dict:
+        pass
+
+    @abstractmethod
+    def put(self, entry: dict, typ, release, revision=None):
+        pass
+
+    @abstractmethod
+    def update(self, fields: dict, typ, release, revision=None):
+        """Update some fields of an existing entry"""
+        pass
+
+    @abstractmethod
+    def remove(self, typ, release, revision=None):
+        pass
+
+    @abstractmethod
+    def items(self) -> list:
+        """[((typ, release, revision), entry), ...]"""
+        pass
+
+
+class JsonMetadataStore(MetadataStore):
+    """The original `<cache_name>.json` file, rewritten whole on every change"""
+
+    def __init__(self, path):
+        self._path = Path(path)
+        self._lock = metadata_lock(self._path)
+
+    def get(self, typ, release, revision=None) -> dict:
+        return self._read().get(metadata_key(typ, release, revision))
+
+    def put(self, entry: dict, typ, release, revision=None):
+        with self._lock:
+            metadata = self._read()
+            metadata[metadata_key(typ, release, revision)] = {
+                "typ": typ,
+                "release": release,
+                "revision": revision,
+                **entry,
+            }
+            write_json_atomic(self._path, metadata)
+
+    def update(self, fields: dict, typ, release, revision=None):
+        with self._lock:
+            metadata = self._read()
+            key = metadata_key(typ, release, revision)
+            if key in metadata:
+                metadata[key].update(fields)
+                write_json_atomic(self._path, metadata)
+
+    def remove(self, typ, release, revision=None):
+        with self._lock:
+            metadata = self._read()
+            if metadata.pop(metadata_key(typ, release, revision), None):
+                write_json_atomic(self._path, metadata)
+
+    def items(self) -> list:
+        return [(self._parse_key(key, entry), entry) for key, entry in self._read().items()]
+
+    @staticmethod
+    def _parse_key(key, entry):
+        if "typ" in entry:
+            return entry["typ"], entry["release"], entry["revision"]
+        typ, release, *revision = key.split("_", 2)
+        return typ, release, revision[0] if revision else None
+
+    def _read(self):
+        if self._path.exists():
+            with open(self._path, "r") as outfile:
+                return json.load(outfile)
+        return {}
+
+
+class SqliteMetadataStore(MetadataStore):
+    """Indexed, transactional metadata in `metadata.db`, shared by all caches of a base path
+    - entries of an existing `<cache_name>.json` are migrated on first use
+    - `readonly` opens an existing database without writing to it (ie on a shared mount)
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS artifacts (
+            cache TEXT NOT NULL,
+            typ TEXT NOT NULL,
+            release TEXT NOT NULL,
+            revision TEXT NOT NULL DEFAULT '',
+            binary_path TEXT NOT NULL,
+            timestamp TEXT,
+            size INTEGER,
+            last_access REAL,
+            hash TEXT,
+            tree_hash TEXT,
+            fingerprint TEXT,
+            PRIMARY KEY (cache, typ, release, revision)
+        );
+        CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (cache, last_access);
+    """
+
+    def __init__(self, path, cache_name, json_path=None, readonly=False):
+        self._path = Path(path)
+        self._cache_name = cache_name
+        self._readonly = readonly
+        if readonly:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        if json_path and Path(json_path).exists():
+            self.migrate(json_path)
+
+    def _connect(self):
+        if self._readonly:
+            # immutable: no locks nor -shm/-wal files, which a read-only mount could not hold
+            conn = sqlite3.connect(f"{self._path.absolute().as_uri()}?mode=ro&immutable=1", uri=True, timeout=60)
+            conn.row_factory = sqlite3.Row
+            return _Connection(conn)
+        conn = sqlite3.connect(self._path, timeout=60)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def get(self, typ, release, revision=None) -> dict:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM artifacts WHERE cache=? AND typ=? AND release=? AND revision=?",
+                (self._cache_name, typ, release, revision or ""),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put(self, entry: dict, typ, release, revision=None):
+        values = [entry.get(field) for field in FIELDS]
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO artifacts (cache, typ, release, revision, {', '.join(FIELDS)}) "
+                f"VALUES (?, ?, ?, ?, {', '.join('?' * len(FIELDS))})",
+                (self._cache_name, typ, release, revision or "", *values),
+            )
+
+    def update(self, fields: dict, typ, release, revision=None):
+        fields = {k: v for k, v in fields.items() if k in FIELDS}
+        if not fields:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE artifacts SET {', '.join(f'{k}=?' for k in fields)} "
+                "WHERE cache=? AND typ=? AND release=? AND revision=?",
+                (*fields.values(), self._cache_name, typ, release, revision or ""),
+            )
+
+    def remove(self, typ, release, revision=None):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM artifacts WHERE cache=? AND typ=? AND release=? AND revision=?",
+                (self._cache_name, typ, release, revision or ""),
+            )
+
+    def items(self) -> list:
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT typ, release, revision, {', '.join(FIELDS)} FROM artifacts WHERE cache=?",
+                (self._cache_name,),
+            ).fetchall()
+        return [((row["typ"], row["release"], row["revision"] or None), {f: row[f] for f in FIELDS}) for row in rows]
+
+    def migrate(self, json_path):
+        """Import entries of a json metadata file, then rename it to `<name>.json.migrated`"""
+        json_path = Path(json_path)
+        with metadata_lock(json_path):
+            if not json_path.exists():
+                return
+            items = JsonMetadataStore(json_path).items()
+            with self._connect() as conn:
+                for (typ, release, revision), entry in items:
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO artifacts (cache, typ, release, revision, {', '.join(FIELDS)}) "
+                        f"VALUES (?, ?, ?, ?, {', '.join('?' * len(FIELDS))})",
+                        (self._cache_name, typ, release, revision or "", *[entry.get(f) for f in FIELDS]),
+                    )
+            json_path.replace(json_path.with_name(f"{json_path.name}.migrated"))
+            logger.info(f"Migrated {len(items)} entries from {json_path} to {self._path}")
+
+
+class _Connection:
+    """sqlite3 connection that commits/rolls back and closes on exit"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self._conn.close()
+
+
+def make_metadata_store(metadata, cache_name, base_path, readonly=False) -> MetadataStore:
+    """`metadata` is "json" (default), "sqlite" or a `MetadataStore`
+    With `readonly`, whichever store exists under `base_path` is read, never written.
+    """
+    if isinstance(metadata, MetadataStore):
+        return metadata
+    json_path = Path(base_path).joinpath(f"{cache_name}.json")
+    if readonly:
+        db_path = Path(base_path).joinpath("metadata.db")
+        if db_path.exists():
+            return SqliteMetadataStore(db_path, cache_name, readonly=True)
+        return JsonMetadataStore(json_path)
+    if metadata in (None, "json"):
+        return JsonMetadataStore(json_path)
+    if metadata == "sqlite":
+        return SqliteMetadataStore(Path(base_path).joinpath("metadata.db"), cache_name, json_path)
+    raise ValueError(f"Unknown metadata backend {metadata}")
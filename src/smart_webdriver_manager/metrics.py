@@ -0,0 +1,142 @@
+"""Structured instrumentation of installs
+
+Events are dicts with an `event` name, a `time` and event fields, passed to every
+callback registered with `subscribe`:
+
+- `phase`: `phase` (resolve_release, lookup_position, probe_revisions, download, unpack,
+  and export/import of bundles), `seconds`, `ok`, and the phase's fields (ie `version`)
+- `cache`: `cache` (drivers, browsers, resolutions), `hit`; a browser resolution missing
+  from the cache also looks up the driver resolution
+- `probe`: `revision`, `found`
+- `download`: `url`, `bytes`, `seconds`
+
+With no subscriber, `emit` and `phase` return at once. `Metrics` aggregates the events
+and exports them as json or Prometheus text.
+
+>>> metrics = Metrics()
+>>> unsubscribe = subscribe(metrics)
+>>> emit("cache", cache="drivers", hit=True)
+>>> metrics.snapshot()["cache"]
+{'drivers': {'hit': 1, 'miss': 0}}
+>>> unsubscribe()
+"""
+import json
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import logger
+
+_subscribers = ()
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Call `callback(event)` for every event, from whichever thread emits it
+    Returns a function that unsubscribes it.
+    """
+    global _subscribers
+    with _subscribers_lock:
+        _subscribers = (*_subscribers, callback)
+
+    def unsubscribe():
+        global _subscribers
+        with _subscribers_lock:
+            _subscribers = tuple(s for s in _subscribers if s is not callback)
+
+    return unsubscribe
+
+
+def emit(event, **fields):
+    if not _subscribers:
+        return
+    data = {"event": event, "time": time.time(), **fields}
+    for callback in _subscribers:
+        try:
+            callback(data)
+        except Exception as e:
+            logger.warning(f"Metrics subscriber {callback} failed: {e}")
+
+
+@contextmanager
+def phase(name, **fields):
+    """Time the block as phase `name`, emitted even if it raises (with `ok` False)"""
+    if not _subscribers:
+        yield
+        return
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        emit("phase", phase=name, seconds=time.perf_counter() - start, ok=ok, **fields)
+
+
+class Metrics:
+    """Subscriber aggregating events into counters and per-phase timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = defaultdict(lambda: {"count": 0, "errors": 0, "seconds_sum": 0.0, "seconds_max": 0.0})
+        self._cache = defaultdict(lambda: {"hit": 0, "miss": 0})
+        self._probes = {"found": 0, "missing": 0}
+        self._downloads = {"count": 0, "bytes": 0, "seconds": 0.0}
+
+    def __call__(self, event):
+        with self._lock:
+            if event["event"] == "phase":
+                stats = self._phases[event["phase"]]
+                stats["count"] += 1
+                stats["errors"] += not event["ok"]
+                stats["seconds_sum"] += event["seconds"]
+                stats["seconds_max"] = max(stats["seconds_max"], event["seconds"])
+            elif event["event"] == "cache":
+                self._cache[event["cache"]]["hit" if event["hit"] else "miss"] += 1
+            elif event["event"] == "probe":
+                self._probes["found" if event["found"] else "missing"] += 1
+            elif event["event"] == "download":
+                self._downloads["count"] += 1
+                self._downloads["bytes"] += event["bytes"]
+                self._downloads["seconds"] += event["seconds"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            downloads = dict(self._downloads)
+            downloads["bytes_per_second"] = downloads["bytes"] / downloads["seconds"] if downloads["seconds"] else 0.0
+            return {
+                "phases": {name: dict(stats) for name, stats in self._phases.items()},
+                "cache": {name: dict(stats) for name, stats in self._cache.items()},
+                "probes": dict(self._probes),
+                "downloads": downloads,
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ["# TYPE swm_phase_seconds summary"]
+        for name, stats in snapshot["phases"].items():
+            lines.append(f'swm_phase_seconds_count{{phase="{name}"}} {stats["count"]}')
+            lines.append(f'swm_phase_seconds_sum{{phase="{name}"}} {stats["seconds_sum"]}')
+        lines.append("# TYPE swm_phase_errors_total counter")
+        for name, stats in snapshot["phases"].items():
+            lines.append(f'swm_phase_errors_total{{phase="{name}"}} {stats["errors"]}')
+        lines.append("# TYPE swm_cache_requests_total counter")
+        for name, stats in snapshot["cache"].items():
+            for result in ("hit", "miss"):
+                lines.append(f'swm_cache_requests_total{{cache="{name}",result="{result}"}} {stats[result]}')
+        lines.append("# TYPE swm_probes_total counter")
+        for result, count in snapshot["probes"].items():
+            lines.append(f'swm_probes_total{{result="{result}"}} {count}')
+        lines.append("# TYPE swm_downloads_total counter")
+        lines.append(f'swm_downloads_total {snapshot["downloads"]["count"]}')
+        lines.append("# TYPE swm_download_bytes_total counter")
+        lines.append(f'swm_download_bytes_total {snapshot["downloads"]["bytes"]}')
+        lines.append("# TYPE swm_download_seconds_total counter")
+        lines.append(f'swm_download_seconds_total {snapshot["downloads"]["seconds"]}')
+        return "\n".join(lines) + "\n"
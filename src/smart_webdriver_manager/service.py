@@ -0,0 +1,195 @@
+"""Pre-started chromedriver processes, leased one test at a time
+
+    with cdm.driver_service_pool(size=4, max_sessions=50) as pool:
+        with pool.lease() as service:
+            driver = webdriver.Remote(command_executor=service.url, options=options)
+            ...
+            driver.quit()
+
+A chromedriver spends most of its startup before it listens; a pool pays that ahead
+of time, in the background, instead of in every test.
+"""
+import json
+import queue
+import socket
+import subprocess
+import threading
+import time
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.request import urlopen
+
+from . import logger
+
+START_ATTEMPTS = 3
+RETRY_DELAY = 30  # seconds between rounds of start attempts once they all failed, at most
+LEASE_POLL = 0.1  # seconds a lease waits before checking for a start failure
+
+
+def free_port() -> int:
+    """A port nothing listens on, as allocated by the OS"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class DriverService:
+    """One chromedriver process listening on `port` (127.0.0.1), started on creation
+    - `args` are extra command line arguments, ie ["--verbose", "--log-path=..."]
+    - `sessions` counts the leases it served, see `DriverServicePool`
+    """
+
+    def __init__(self, driver_path, args=(), start_timeout=10):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.sessions = 0
+        self._process = subprocess.Popen(
+            [str(driver_path), f"--port={self.port}", *args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + start_timeout
+        while not self.healthy():
+            if self._process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise TimeoutError(f"{driver_path} did not listen on port {self.port} within {start_timeout}s")
+            time.sleep(0.05)
+        logger.debug(f"Started {driver_path} on port {self.port}")
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    def healthy(self) -> bool:
+        """Process alive and its `/status` ready"""
+        if self._process.poll() is not None:
+            return False
+        try:
+            with urlopen(f"{self.url}/status", timeout=1) as resp:
+                return bool(json.load(resp)["value"].get("ready", True))
+        except (OSError, ValueError, KeyError, AttributeError):
+            return False
+
+    def stop(self):
+        if self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+
+
+class DriverServicePool:
+    """`size` chromedriver services of `driver_path`, started ahead in the background
+    - `lease` hands out a healthy service, checked before and after use
+    - a service is restarted after `max_sessions` leases (None is never), or if unhealthy
+    - a service failing `START_ATTEMPTS` starts is retried in the background (backing off
+      to `RETRY_DELAY`); meanwhile `lease` raises the failure rather than waiting
+    - `close` (or exit) stops every service, leased ones included
+    - `hold` (ie from `SmartCache.use`) is released on close, it keeps the driver from
+      being removed from the cache while the pool runs it
+    """
+
+    def __init__(self, driver_path, size=2, max_sessions=None, args=(), start_timeout=10, hold=None):
+        self._driver_path = Path(driver_path)
+        self._max_sessions = max_sessions
+        self._args = list(args)
+        self._start_timeout = start_timeout
+        self._ready = queue.Queue()
+        self._services = set()
+        self._error = None
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="swm-service")
+        self._finalizer = weakref.finalize(self, _close_pool, self._executor, self._services, self._closed, hold)
+        for _ in range(size):
+            self._executor.submit(self._fill)
+
+    def _fill(self):
+        delay = 0.5
+        while True:
+            for attempt in range(START_ATTEMPTS):
+                try:
+                    service = DriverService(self._driver_path, self._args, self._start_timeout)
+                    break
+                except (OSError, TimeoutError) as e:
+                    logger.warning(f"Failed to start {self._driver_path} ({e}), attempt {attempt + 1}/{START_ATTEMPTS}")
+                    error = e
+            else:
+                self._error = error
+                if self._closed.wait(delay):
+                    return
+                delay = min(delay * 2, RETRY_DELAY)
+                continue
+            self._error = None
+            break
+        if not self._finalizer.alive:
+            service.stop()  # closed meanwhile
+            return
+        self._services.add(service)
+        self._ready.put(service)
+
+    def _replace(self, service):
+        self._services.discard(service)
+        service.stop()
+        if self._finalizer.alive:
+            self._executor.submit(self._fill)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Yield a healthy `DriverService`, waiting up to `timeout` seconds for one
+        Raises the last start failure while none is ready and the driver fails to start.
+        Quit the session(s) created on it before leaving the block.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = LEASE_POLL if deadline is None else min(max(deadline - time.monotonic(), 0), LEASE_POLL)
+            try:
+                service = self._ready.get(timeout=remaining)
+            except queue.Empty:
+                error = self._error
+                if error is not None:
+                    raise error.with_traceback(None)
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"No {self._driver_path.name} service became available in {timeout}s") from None
+                continue
+            if service.healthy():
+                break
+            logger.warning(f"Restarting unhealthy {self._driver_path.name} on port {service.port}")
+            self._replace(service)
+        try:
+            yield service
+        finally:
+            service.sessions += 1
+            if not self._finalizer.alive:
+                service.stop()
+            elif self._max_sessions and service.sessions >= self._max_sessions:
+                logger.debug(f"Recycling {self._driver_path.name} on port {service.port} after {service.sessions} uses")
+                self._replace(service)
+            elif not service.healthy():
+                logger.warning(f"Restarting unhealthy {self._driver_path.name} on port {service.port}")
+                self._replace(service)
+            else:
+                self._ready.put(service)
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _close_pool(executor, services, closed, hold):
+    closed.set()
+    executor.shutdown(wait=True, cancel_futures=True)
+    for service in list(services):
+        service.stop()
+    if hold is not None:
+        hold.release()
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import stat
+
+from pathlib import Path
+
+from . import logger
+
+
+class ContentStore:
+    """Content-addressed store of extracted files under `<base_path>/objects`
+    - every regular file is keyed by its mode and content sha256, and hardlinked to `objects/ab/abcdef...`
+    - byte-identical files across releases/revisions then share one inode
+    - shared files are made read-only, so an in-place write fails instead of leaking into
+      other releases; deleting a release only drops its own links
+    - objects left with no link but the store's are garbage, see `prune`
+    """
+
+    def __init__(self, base_path):
+        self._objects_path = Path(base_path).joinpath("objects")
+
+    def dedupe(self, directory, digests=None) -> int:
+        """Hardlink the files of `directory` into the store, returns the bytes saved
+        - `digests` ({relative path: content sha256}, ie from unpacking) spares reading those files
+        """
+        digests = digests or {}
+        saved = files = 0
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = Path(root, name)
+                st = path.lstat()
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                try:
+                    saved += self._link(path, st, digests.get(path.relative_to(directory).as_posix()))
+                except OSError as e:
+                    logger.warning(f"Content store unavailable ({e}), keeping {directory} as is")
+                    return saved
+                files += 1
+        logger.info(f"Deduplicated {files} files in {directory}, saved {saved} bytes")
+        return saved
+
+    def _link(self, path: Path, st, content=None) -> int:
+        mode = stat.S_IMODE(st.st_mode) & ~0o222
+        digest = self._digest(mode, content or self._content_digest(path))
+        obj = self._objects_path.joinpath(digest[:2], digest)
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            if obj.exists():
+                if os.path.samefile(obj, path):
+                    return 0
+                tmp = path.with_name(f".{path.name}.swm-link")
+                try:
+                    os.link(obj, tmp)
+                except FileNotFoundError:
+                    continue  # pruned meanwhile
+                os.replace(tmp, path)
+                return st.st_size
+            os.chmod(path, mode)
+            try:
+                os.link(path, obj)
+                return 0
+            except FileExistsError:
+                continue  # stored concurrently
+
+    @staticmethod
+    def _digest(mode: int, content: str) -> str:
+        return hashlib.sha256(f"{mode:o}:{content}".encode()).hexdigest()
+
+    @staticmethod
+    def _content_digest(path: Path) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _objects(self):
+        if self._objects_path.exists():
+            for obj in self._objects_path.glob("*/*"):
+                yield obj, obj.stat()
+
+    def report(self) -> dict:
+        """Store usage: `stored_bytes` on disk, `linked_bytes` as seen by releases, `saved_bytes`"""
+        objects = stored = linked = saved = 0
+        for _, st in self._objects():
+            objects += 1
+            stored += st.st_size
+            linked += st.st_size * (st.st_nlink - 1)
+            saved += st.st_size * max(st.st_nlink - 2, 0)
+        return {
+            "objects": objects,
+            "stored_bytes": stored,
+            "linked_bytes": linked,
+            "saved_bytes": saved,
+        }
+
+    def prune(self) -> int:
+        """Remove objects no release links to anymore, returns the bytes freed"""
+        freed = 0
+        for obj, st in self._objects():
+            if st.st_nlink == 1:
+                obj.unlink()
+                freed += st.st_size
+        return freed
@@ -1,17 +1,22 @@
 import os
+import errno
+import fnmatch
+import hashlib
+import json
 import zipfile
 import shutil
 import tempfile
-import requests
-import backoff
 import platform
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from urllib.parse import urlparse, unquote
 from pathlib import Path
-from packaging.version import parse, Version
 
 from . import logger
 
+# moved to `download`, which imports `requests`; still importable from here
+_DOWNLOAD_NAMES = ("SmartSession", "make_session", "download_file", "RangeNotSatisfied", "RANGE_PART_SIZE")
+
 
 class LinuxZipFileWithPermissions(zipfile.ZipFile):
     """Class for extract files in linux with right permissions
@@ -24,39 +29,307 @@ class LinuxZipFileWithPermissions(zipfile.ZipFile):
         if targetpath is None:
             targetpath = os.getcwd()
         target = super()._extract_member(member, targetpath, pwd)
+        self.set_permissions(member, target)
+        return target
+
+    @staticmethod
+    def set_permissions(member, target):
         attr = member.external_attr >> 16
         if attr != 0:
             os.chmod(target, attr)
-        return target
 
 
-def unpack_zip(zip_path):
-    """Unzip zip to same diretory"""
-    zip_class = zipfile.ZipFile if platform.system() == "Windows" else LinuxZipFileWithPermissions
-    archive = zip_class(zip_path)
+class FileLock:
+    """Cross-process advisory lock on `path` (flock/msvcrt)
+    Each instance opens its own handle, so it also excludes other threads.
+    """
+
+    def __init__(self, path):
+        self._path = Path(path)
+        self._fd = None
+
+    def acquire(self, blocking=True) -> bool:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if platform.system() == "Windows":
+                import msvcrt
+
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                while True:
+                    try:
+                        msvcrt.locking(fd, mode, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+            else:
+                import fcntl
+
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if platform.system() == "Windows":
+            import msvcrt
+
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SingleFlight:
+    """Thread-safe memo where concurrent calls for a key coalesce into one
+    - the first `do(key, fn)` runs `fn`, callers arriving meanwhile wait for its result
+    - results are kept until `forget`, or until `valid(result)` turns false
+    - failures are raised to every waiting caller, then dropped so the next call retries
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def do(self, key, fn, valid=None):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and future.done():
+                if future.exception() or (valid is not None and not valid(future.result())):
+                    future = None
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                self.forget(key, future)
+                future.set_exception(e)
+        return future.result()
+
+    def peek(self, key):
+        """Result of `key` if computed successfully, else None; never waits"""
+        with self._lock:
+            future = self._futures.get(key)
+        if future is not None and future.done() and not future.exception():
+            return future.result()
+        return None
+
+    def forget(self, key, future=None) -> bool:
+        """Drop the result of `key` (only if it is `future`, when given)"""
+        with self._lock:
+            if key in self._futures and future in (None, self._futures[key]):
+                del self._futures[key]
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+
+
+def write_json_atomic(path, data):
+    """Write json to a temp file beside `path`, then rename it into place"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
     try:
-        archive.extractall(Path(zip_path).parent)
-    except Exception as e:
-        if e.args[0] not in [26, 13] and e.args[1] not in ["Text file busy", "Permission denied"]:
-            raise e
-    return archive.namelist()
+        with os.fdopen(fd, "w") as outfile:
+            json.dump(data, outfile, indent=4)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 
-@contextmanager
-def download_file(url) -> Path:
-    """Better download"""
-    name = Path(urlparse(unquote(url)).path).name
-    with mktempdir() as tmpdir:
+# Members of a `profile` matching `exclude` are not extracted, unless they match `include`
+EXTRACT_PROFILES = {
+    "full": {},
+    # headless runs only need the default locale
+    "headless": {"exclude": ["*/locales/*.pak"], "include": ["*/locales/en-US.pak"]},
+}
+UNPACK_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _zip_class():
+    return zipfile.ZipFile if platform.system() == "Windows" else LinuxZipFileWithPermissions
 
-        @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=30)
-        def get():
-            with requests.get(url, stream=True) as r:
-                save_path = tmpdir.joinpath(name)
-                with open(save_path, "wb") as f:
-                    shutil.copyfileobj(r.raw, f, length=16 * 1024 * 1024)
-                return save_path
 
-        yield get()
+def _selected(name, profile) -> bool:
+    match = lambda patterns: any(fnmatch.fnmatchcase(name, p) for p in patterns)
+    return not match(profile.get("exclude", ())) or match(profile.get("include", ()))
+
+
+def _member_target(name) -> str:
+    """Relative path a zip member extracts to, sanitized as `ZipFile.extract` does"""
+    parts = [p for p in os.path.splitdrive(name)[1].replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return "/".join(parts)
+
+
+def _extract_members(zip_path, members, directory, digests):
+    with _zip_class()(zip_path) as archive:
+        for member in members:
+            rel = _member_target(member.filename)
+            target = Path(directory, rel)
+            h = hashlib.sha256()
+            try:
+                with archive.open(member) as source, open(target, "wb") as f:
+                    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                        h.update(chunk)
+                        f.write(chunk)
+                if isinstance(archive, LinuxZipFileWithPermissions):
+                    archive.set_permissions(member, target)
+            except OSError as e:
+                if e.errno not in (errno.ETXTBSY, errno.EACCES):
+                    raise
+                continue
+            digests[rel] = h.hexdigest()
+
+
+def unpack_zip(zip_path, profile=None, max_workers=UNPACK_WORKERS, digests=None):
+    """Unzip zip to same diretory
+    - `profile` (a name of `EXTRACT_PROFILES` or a dict alike) skips unneeded members
+    - files are extracted by `max_workers` threads, each with its own handle on the archive
+    - files are hashed as they are written, into `digests` ({relative path: sha256}) if given
+    - member names are sanitized as `ZipFile.extract` does, nothing is written outside the directory
+    Returns the extracted member names (sanitized)
+    """
+    digests = {} if digests is None else digests
+    if isinstance(profile, str):
+        if profile not in EXTRACT_PROFILES:
+            raise ValueError(f"Unknown extract profile {profile}, expected one of {list(EXTRACT_PROFILES)}")
+        profile = EXTRACT_PROFILES[profile]
+    profile = profile or {}
+    directory = Path(zip_path).parent
+    with _zip_class()(zip_path) as archive:
+        members = [m for m in archive.infolist() if _selected(m.filename, profile) and _member_target(m.filename)]
+    for member in members:  # parents first, workers would race creating them
+        target = directory.joinpath(_member_target(member.filename))
+        (target if member.is_dir() else target.parent).mkdir(parents=True, exist_ok=True)
+    files = sorted((m for m in members if not m.is_dir()), key=lambda m: m.compress_size, reverse=True)
+    workers = max(1, min(max_workers, len(files)))
+    # deal the largest first round-robin, so each worker gets a similar share of bytes
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="swm-unpack") as executor:
+        futures = [
+            executor.submit(_extract_members, zip_path, files[i::workers], directory, digests) for i in range(workers)
+        ]
+        for future in futures:
+            future.result()
+    return [_member_target(m.filename) + ("/" if m.is_dir() else "") for m in members]
+
+
+FICLONE = 0x40049409  # linux ioctl, copy-on-write clone of a whole file
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def clone_tree(src, dst, link=None, exclude=None) -> str:
+    """Copy directory `src` into `dst` as cheaply as the filesystem allows
+    - reflink (btrfs, xfs, ...): every file shares blocks until written
+    - else files `link(relative_path)` deems immutable are hardlinked, the rest copied
+    - else plain copies
+    Files matching `exclude(relative_path)` are skipped. Returns the method used.
+    """
+    src, dst = Path(src), Path(dst)
+    reflink = platform.system() == "Linux" or None
+    linked = False
+    for root, dirs, names in os.walk(src):
+        rel_root = Path(root).relative_to(src)
+        dst.joinpath(rel_root).mkdir(parents=True, exist_ok=True)
+        for name in names + [d for d in dirs if Path(root, d).is_symlink()]:
+            rel = rel_root.joinpath(name)
+            if exclude and exclude(rel):
+                continue
+            source, target = src.joinpath(rel), dst.joinpath(rel)
+            if source.is_symlink():
+                os.symlink(os.readlink(source), target)
+                continue
+            if reflink:
+                try:
+                    _reflink(source, target)
+                    shutil.copystat(source, target)
+                    continue
+                except OSError:
+                    target.unlink(missing_ok=True)
+                    reflink = False
+            if link and link(rel):
+                try:
+                    os.link(source, target)
+                    linked = True
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(source, target)
+    return "reflink" if reflink else "hardlink" if linked else "copy"
+
+
+class StreamDigest:
+    """sha256 of a download, computed while it streams
+    Data written in file order is hashed as it arrives. Parts downloaded ahead of it
+    are read back (from the page cache) once everything before them is written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.begin(None)
+
+    def begin(self, path):
+        with self._lock:
+            self._path = path
+            self._hash = hashlib.sha256()
+            self._hashed = 0
+            self._written = {}
+
+    def write(self, start, offset, data):
+        """`data` was written at `offset`, in the part starting at `start`
+        Flush it first if parts may be read back, ie with parallel parts.
+        """
+        with self._lock:
+            self._written[start] = offset + len(data)
+            if offset == self._hashed:
+                self._hash.update(data)
+                self._hashed += len(data)
+            self._catch_up()
+
+    def _catch_up(self):
+        end = self._hashed
+        for start in sorted(self._written):
+            if start > end:
+                break
+            end = max(end, self._written[start])
+        if end > self._hashed:
+            with open(self._path, "rb") as f:
+                f.seek(self._hashed)
+                while self._hashed < end:
+                    chunk = f.read(min(1024 * 1024, end - self._hashed))
+                    self._hash.update(chunk)
+                    self._hashed += len(chunk)
+
+    def hexdigest(self) -> str:
+        with self._lock:
+            return self._hash.hexdigest()
 
 
 @contextmanager
@@ -66,6 +339,7 @@ def mktempdir() -> Path:
         tmp = tempfile.mkdtemp()
         yield Path(tmp)
     finally:
+        import backoff
 
         @backoff.on_exception(backoff.expo, shutil.Error, max_time=10)
         def remove():
@@ -73,3 +347,11 @@ def mktempdir() -> Path:
             logger.debug(f"Removed {tmp}")
 
         remove()
+
+
+def __getattr__(name):
+    if name in _DOWNLOAD_NAMES:
+        from smart_webdriver_manager import download
+
+        return getattr(download, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
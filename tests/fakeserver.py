@@ -0,0 +1,269 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse, parse_qs
+
+
+def make_zip(files: dict) -> bytes:
+    """Build an in-memory zip of {name: bytes}"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = 0o755 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+    return buf.getvalue()
+
+
+LOCALES = ["am", "ar", "bg", "bn", "ca", "cs", "da", "de", "el", "en-GB", "en-US", "es", "es-419", "et", "fa",
+           "fi", "fil", "fr", "gu", "he", "hi", "hr", "hu", "id", "it", "ja", "kn", "ko", "lt", "lv", "ml", "mr",
+           "ms", "nb", "nl", "pl", "pt-BR", "pt-PT", "ro", "ru", "sk", "sl", "sr", "sv", "sw", "ta", "te", "th",
+           "tr", "uk", "vi", "zh-CN", "zh-TW"]
+
+
+def make_chromium_zip(path, scale=1.0):
+    """Write a zip laid out (and, at scale 1, sized) like a linux chromium snapshot
+    - half random, half repetitive bytes, so it deflates roughly like the real one
+    Returns the total uncompressed size
+    """
+    def blob(size):
+        return os.urandom(size // 2) + b"chromium" * (size // 16)
+
+    files = {"chrome-linux/chrome": int(220e6 * scale), "chrome-linux/resources.pak": int(15e6 * scale)}
+    files.update({f"chrome-linux/lib{n}.so": int(4e6 * scale) for n in ("EGL", "GLESv2", "vk_swiftshader")})
+    files.update({f"chrome-linux/locales/{locale}.pak": int(6e5 * scale) for locale in LOCALES})
+    total = 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, size in files.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = 0o755 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            data = blob(size)
+            archive.writestr(info, data)
+            total += len(data)
+    return total
+
+
+STUB_CHROMEDRIVER = """\
+import json, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+port = int(next(a for a in sys.argv[1:] if a.startswith("--port=")).split("=")[1])
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"value": {"ready": self.path == "/status", "message": "stub"}}).encode()
+        self.send_response(200 if self.path == "/status" else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+
+def make_stub_chromedriver(path):
+    """Executable standing in for chromedriver: serves `/status` on `--port`"""
+    path.write_text(f"#!{sys.executable}\n{STUB_CHROMEDRIVER}")
+    path.chmod(0o755)
+    return path
+
+
+def configure(cx, url):
+    """Point a context manager at a fake server at `url`"""
+    cx.url_driver_repo = f"{url}/driver"
+    cx.url_driver_repo_latest = f"{cx.url_driver_repo}/LATEST_RELEASE"
+    cx.url_browser_deps = f"{url}/deps.json"
+    cx.url_browser_zip = f"{url}/browser/{cx.browser_platform}%2F{{}}%2Fchrome-{{}}.zip?alt=media"
+    cx.url_browser_list = f"{url}/list"
+    return cx
+
+
+class FakeChromeServer:
+    """Local stand-in for the chromedriver storage, deps.json and chromium snapshot endpoints
+
+    - `releases`: {version: release}, version 0 is LATEST_RELEASE
+    - `positions`: {release: chromium_base_position}
+    - `revisions`: chromium snapshot revisions that exist
+    - `latency`: {path prefix: seconds} added before responding to a GET
+    - `bandwidth`: bytes/second per connection (None is unlimited)
+    - `ranges`: honor Range requests
+    - `drops`: {path prefix: n}, the next n GETs are cut off halfway
+    - `files`: {name: bytes} served at /files/<name>
+    - `list_page_size`: snapshots per page of the bucket listing at /list
+
+    `requests` lists the (method, path) of every request, `spans` their (method, path, start, end)
+    monotonic times, see `concurrency`.
+
+    Archives are also served in the mirror layout (`SmartChromeContextManager(mirrors=...)`).
+    """
+
+    def __init__(self, releases=None, positions=None, revisions=None):
+        self.releases = releases or {0: "96.0.4664.45", 96: "96.0.4664.45"}
+        self.positions = positions or {"96.0.4664.45": 929512}
+        self.revisions = set(revisions or [929500])
+        self.driver_zip = make_zip({"chromedriver": b"#!/bin/sh\n"})
+        self.browser_zip = make_zip({"chrome-linux/chrome": b"#!/bin/sh\n", "chrome-linux/resources.pak": b"x" * 1024})
+        self.latency = {}
+        self.bandwidth = None
+        self.ranges = True
+        self.drops = {}
+        self.files = {}
+        self.list_page_size = 1000
+        self.requests = []
+        self.spans = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def configure(self, cx):
+        """Point a context manager at this server"""
+        return configure(cx, self.url)
+
+    def count(self, method=None, prefix=""):
+        with self._lock:
+            return sum(1 for m, p in self.requests if (method is None or m == method) and p.startswith(prefix))
+
+    def concurrency(self, method=None, prefix="") -> int:
+        """Most requests (`prefix` a str or tuple of them) that were in flight at once"""
+        with self._lock:
+            spans = [(s, e) for m, p, s, e in self.spans if (method is None or m == method) and p.startswith(prefix)]
+        events = sorted([(s, 1) for s, _ in spans] + [(e, -1) for _, e in spans])
+        peak = current = 0
+        for _, step in events:
+            current += step
+            peak = max(peak, current)
+        return peak
+
+    def resolve(self, method, path):
+        """Return (status, body) for a request"""
+        url = urlparse(path)
+        parts = unquote(url.path).strip("/").split("/")
+        if parts[0] == "driver" and len(parts) == 2 and parts[1].startswith("LATEST_RELEASE"):
+            version = int(parts[1][len("LATEST_RELEASE_"):] or 0)
+            if version not in self.releases:
+                return 404, b"Not found"
+            return 200, self.releases[version].encode()
+        if parts[0] == "driver" and len(parts) == 3:
+            if parts[1] not in self.releases.values():
+                return 404, b"Not found"
+            return 200, self.driver_zip
+        if parts[0] == "deps.json":
+            release = parse_qs(url.query)["version"][0]
+            return 200, json.dumps({"chromium_base_position": str(self.positions[release])}).encode()
+        if parts[0] == "list":
+            query = parse_qs(url.query)
+            start = int(query.get("pageToken", ["0"])[0])
+            revisions = sorted(self.revisions)[start : start + self.list_page_size]
+            page = {"prefixes": [f"{query['prefix'][0]}{r}/" for r in revisions]}
+            if start + self.list_page_size < len(self.revisions):
+                page["nextPageToken"] = str(start + self.list_page_size)
+            return 200, json.dumps(page).encode()
+        if parts[0] == "files" and parts[1] in self.files:
+            return 200, self.files[parts[1]]
+        if parts[0] == "browser" and len(parts) == 4:
+            if int(parts[2]) not in self.revisions:
+                return 404, b"Not found"
+            return 200, self.browser_zip
+        if parts[0] == "chromedriver" and len(parts) == 3:
+            if parts[1] not in self.releases.values():
+                return 404, b"Not found"
+            return 200, self.driver_zip
+        if parts[0] == "chromium-browser-snapshots" and len(parts) == 4:
+            if int(parts[2]) not in self.revisions:
+                return 404, b"Not found"
+            return 200, self.browser_zip
+        return 404, b"Not found"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _respond(self, body=True):
+                start = time.monotonic()
+                with server._lock:
+                    server.requests.append((self.command, self.path))
+                try:
+                    self._respond_with(body)
+                finally:
+                    with server._lock:
+                        server.spans.append((self.command, self.path, start, time.monotonic()))
+
+            def _respond_with(self, body):
+                status, data = server.resolve(self.command, self.path)
+                for prefix, delay in server.latency.items():
+                    if body and self.path.startswith(prefix):
+                        time.sleep(delay)
+                start, end = 0, len(data) - 1
+                byte_range = self.headers.get("Range")
+                if status == 200 and server.ranges and byte_range:
+                    first, _, last = byte_range.partition("=")[2].partition("-")
+                    start, end = int(first), min(int(last or end), end)
+                    status = 206
+                self.send_response(status)
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if body:
+                    self._send(data[start : end + 1])
+
+            def _send(self, data):
+                drop = next((p for p, n in server.drops.items() if n and self.path.startswith(p)), None)
+                if drop is not None:
+                    with server._lock:
+                        server.drops[drop] -= 1
+                    data = data[: len(data) // 2]
+                    self.close_connection = True
+                step = 64 * 1024
+                for i in range(0, len(data), step):
+                    self.wfile.write(data[i : i + step])
+                    if server.bandwidth:
+                        time.sleep(len(data[i : i + step]) / server.bandwidth)
+
+            def do_GET(self):
+                self._respond()
+
+            def do_HEAD(self):
+                self._respond(body=False)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
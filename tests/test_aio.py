@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from asserts import assert_equal, assert_false, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from smart_webdriver_manager.aio import AsyncChromeDriverManager  # noqa: E402
+
+
+def test_async_manager_shares_cache_with_sync_manager():
+    async def install(server, tmpdir):
+        async with AsyncChromeDriverManager(version=96, base_path=tmpdir) as cdm:
+            server.configure(cdm._cx)
+            return await asyncio.gather(cdm.get_browser_user_data(), cdm.get_driver(), cdm.get_browser())
+
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        user_data_path, driver_path, browser_path = asyncio.run(install(server, tmpdir))
+        assert_true(Path(driver_path).exists())
+        assert_true(Path(browser_path).exists())
+        assert_equal(server.count("GET", "/browser"), 1)
+
+        requests_made = len(server.requests)
+        cdm = ChromeDriverManager(version=96, base_path=tmpdir)
+        assert_equal(cdm.get_driver(), driver_path)
+        assert_equal(cdm.get_browser(), browser_path)
+        assert_equal(cdm.get_browser_user_data(), user_data_path)
+        assert_equal(len(server.requests), requests_made)
+
+
+def test_async_remove():
+    async def install_and_remove(server, tmpdir):
+        async with AsyncChromeDriverManager(version=96, base_path=tmpdir) as cdm:
+            server.configure(cdm._cx)
+            paths = await asyncio.gather(cdm.get_driver(), cdm.get_browser())
+            return paths, await cdm.remove()
+
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        (driver_path, browser_path), removed = asyncio.run(install_and_remove(server, tmpdir))
+        assert_true(removed)
+        assert_false(Path(driver_path).exists())
+        assert_false(Path(browser_path).exists())
+
+
+def test_async_resolutions_share_one_loop():
+    releases = {v: f"{v}.0.0.1" for v in range(80, 97)}
+    positions = {release: 900000 + v for v, release in releases.items()}
+
+    async def resolve(server, tmpdir):
+        async with AsyncChromeDriverManager(base_path=tmpdir) as cdm:
+            server.configure(cdm._cx)
+            return await asyncio.gather(*(cdm._cx.get_browser_release(v) for v in releases))
+
+    with FakeChromeServer(releases, positions, range(899000, 900100)) as server, mktempdir() as tmpdir:
+        resolved = asyncio.run(resolve(server, tmpdir))
+        assert_equal([str(release) for release, _ in resolved], list(releases.values()))
+        assert_equal([int(str(revision)) for _, revision in resolved], [min(900099, p) for p in positions.values()])
+
+
+def test_lock_waiters_do_not_starve_the_executor():
+    async def install(server, tmpdir):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        managers = [AsyncChromeDriverManager(version=96, base_path=tmpdir) for _ in range(9)]
+        for cdm in managers:
+            server.configure(cdm._cx)
+        try:
+            return await asyncio.gather(*(cdm.get_driver() for cdm in managers))
+        finally:
+            await asyncio.gather(*(cdm.close() for cdm in managers))
+
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        server.latency = {"/driver/96": 0.2}
+        paths = []
+        thread = threading.Thread(target=lambda: paths.extend(asyncio.run(install(server, tmpdir))), daemon=True)
+        thread.start()
+        thread.join(60)
+        assert_false(thread.is_alive())
+        assert_equal(len(set(paths)), 1)
+        assert_equal(server.count("GET", "/driver/96"), 1)
+
+
+def test_async_install_retries_after_a_failure():
+    async def install(server, tmpdir):
+        async with AsyncChromeDriverManager(version=96, base_path=tmpdir) as cdm:
+            server.configure(cdm._cx)
+            server.releases.pop(96)
+            with pytest.raises(ValueError):
+                await cdm.get_driver()  # resolution fails
+            server.releases[96] = "96.0.4664.45"
+            server.drops = {"/driver/96": 1}
+            with pytest.raises(aiohttp.ClientError):
+                await cdm.get_driver()  # download fails
+            return await cdm.get_driver()
+
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        assert_true(Path(asyncio.run(install(server, tmpdir))).exists())
+        assert_equal(server.count("GET", "/driver/96"), 2)
@@ -0,0 +1,35 @@
+import importlib.util
+import json
+from pathlib import Path
+
+from asserts import assert_equal, assert_true
+
+from smart_webdriver_manager.utils import mktempdir
+
+
+def load_suite():
+    path = Path(__file__).resolve().parents[1].joinpath("benchmarks", "suite.py")
+    spec = importlib.util.spec_from_file_location("suite", path)
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+    return suite
+
+
+def test_suite_records_and_compares_results(capsys):
+    suite = load_suite()
+    with mktempdir() as tmpdir:
+        output = Path(tmpdir, "results.json")
+        args = ["resolution", "warm_get_driver", "import", "restore"]
+        args += ["--repeat", "1", "--latency", "0", "--scale", "0.001"]
+        assert_equal(suite.main([*args, "--output", str(output)]), 0)
+        results = json.loads(output.read_text())["results"]
+        assert_true(results["resolution.probes"] > 0)
+        assert_equal(results["warm_get_driver.requests"], 0)
+        assert_equal(results["import.network_modules"], 0)
+        assert_true(results["restore.bundle_bytes"] > 0)
+
+        baseline = json.loads(output.read_text())
+        baseline["results"]["resolution.requests"] //= 2
+        output.write_text(json.dumps(baseline))
+        assert_equal(suite.main([*args, "--compare", str(output)]), 1)
+        assert_true("REGRESSION" in capsys.readouterr().out)
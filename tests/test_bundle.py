@@ -0,0 +1,104 @@
+import io
+import json
+import platform
+import tarfile
+from pathlib import Path
+
+import pytest
+from asserts import assert_equal, assert_false, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.bundle import BUNDLE_VERSION, MANIFEST, export_bundle, import_bundle
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+
+def installed_context(server, tmpdir, version=96):
+    cdm = ChromeDriverManager(version=version, base_path=tmpdir)
+    server.configure(cdm._cx)
+    cdm.get_driver()
+    cdm.get_browser()
+    return cdm._cx
+
+
+@pytest.mark.parametrize("name", ["swm.tar.gz", "swm.tar.xz", "swm.tar"])
+def test_bundle_restores_into_another_base_path(name):
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir, mktempdir() as other:
+        cx = installed_context(server, tmpdir)
+        bundle = Path(tmpdir, name)
+        artifacts = export_bundle(cx, bundle)
+        assert_equal([a["cache"] for a in artifacts], ["drivers", "browsers"])
+        with tarfile.open(bundle) as tar:
+            assert_equal(tar.getnames()[0], MANIFEST)
+
+        requests_made = len(server.requests)
+        imported = import_bundle(SmartChromeContextManager(other), bundle, max_workers=4)
+        assert_equal(imported, artifacts)
+        cdm = ChromeDriverManager(version=96, base_path=other)
+        server.configure(cdm._cx)
+        driver, browser = Path(cdm.get_driver()), Path(cdm.get_browser())
+        assert_true(driver.is_relative_to(other) and driver.exists())
+        assert_true(browser.is_relative_to(other) and browser.exists())
+        assert_equal(len(server.requests), requests_made)
+        assert_equal(list(Path(other).rglob(".staging-*")), [])
+
+        assert_equal(import_bundle(SmartChromeContextManager(other), bundle), [])
+
+
+def test_corrupt_bundle_is_rejected():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir, mktempdir() as other:
+        cx = installed_context(server, tmpdir)
+        bundle = Path(tmpdir, "swm.tar")
+        export_bundle(cx, bundle)
+        data = bytearray(bundle.read_bytes())
+        offset = data.rindex(b"#!/bin/sh")  # content of the last (browser) binary
+        data[offset] = ord("?")
+        bundle.write_bytes(bytes(data))
+
+        cx = SmartChromeContextManager(other)
+        with pytest.raises(ValueError):
+            import_bundle(cx, bundle)
+        assert_false(cx._driver_cache.releases())
+        assert_equal(list(Path(other).rglob(".staging-*")), [])
+        not_a_bundle = Path(tmpdir, "resolutions.json")
+        with pytest.raises(ValueError):
+            import_bundle(cx, not_a_bundle)
+
+
+def write_bundle(path, members):
+    """Bundle of one driver artifact whose members are [(name, linkname or bytes)]"""
+    artifact = {"cache": "drivers", "typ": "chromedriver", "release": "1.0", "revision": None, "binary": "chromedriver"}
+    manifest = {"bundle_version": BUNDLE_VERSION, "platform": platform.system(), "artifacts": [artifact]}
+    with tarfile.open(path, "w") as tar:
+        for name, content in [(MANIFEST, json.dumps(manifest).encode()), *members]:
+            info = tarfile.TarInfo(name if name == MANIFEST else f"drivers/chromedriver/1.0/{name}")
+            if isinstance(content, str):
+                info.type, info.linkname = tarfile.SYMTYPE, content
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+
+@pytest.mark.parametrize(
+    "members",
+    [
+        [("esc", "OUTSIDE")],
+        [("esc", "../../../../OUTSIDE")],
+        [("sub/esc", "../..")],
+        [("inner", "sub"), ("inner/file", b"x")],
+        [("chromedriver", "sub"), ("chromedriver", b"x")],
+    ],
+)
+def test_bundle_members_cannot_escape(members):
+    with mktempdir() as tmpdir, mktempdir() as outside:
+        members = [(name, c.replace("OUTSIDE", str(outside)) if isinstance(c, str) else c) for name, c in members]
+        bundle = Path(tmpdir, "evil.tar")
+        write_bundle(bundle, [("sub/file", b"x"), *members, ("esc/file", b"x")])
+        cx = SmartChromeContextManager(Path(tmpdir, "swm"))
+        with pytest.raises(ValueError):
+            import_bundle(cx, bundle)
+        assert_equal(list(Path(outside).iterdir()), [])
+        assert_equal(list(Path(tmpdir, "swm").rglob(".staging-*")), [])
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from pathlib import Path
+
+from asserts import assert_equal, assert_true
+
+from smart_webdriver_manager.cache import BrowserCache, BrowserUserDataCache, DriverCache, RevisionIndex, tree_digest
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.metadata import SqliteMetadataStore
+from smart_webdriver_manager.store import ContentStore
+from smart_webdriver_manager.utils import clone_tree, mktempdir
+
+from fakeserver import FakeChromeServer, configure, make_zip
+
+
+def install_worker(url, base_path, start):
+    start.wait()
+    cx = configure(SmartChromeContextManager(base_path), url)
+    try:
+        return str(cx.get_driver("96.0.4664.45")), str(cx.get_browser("96.0.4664.45", "929500"))
+    finally:
+        cx.close()
+
+
+def test_concurrent_processes_download_each_artifact_once():
+    with FakeChromeServer() as server, mktempdir() as tmpdir:
+        server.latency = {"/driver": 0.3, "/browser": 0.3}
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager, ctx.Pool(8) as pool:
+            start = manager.Event()
+            results = pool.starmap_async(install_worker, [(server.url, str(tmpdir), start)] * 8)
+            start.set()
+            paths = results.get(timeout=60)
+        assert_equal(len(set(paths)), 1)
+        assert_equal(server.count("GET", "/driver/96"), 1)
+        assert_equal(server.count("GET", "/browser"), 1)
+        assert_equal(len(json.loads(Path(tmpdir, "drivers.json").read_text())), 1)
+        assert_equal(len(json.loads(Path(tmpdir, "browsers.json").read_text())), 1)
+        assert_equal([p.name for p in Path(tmpdir, "browsers", "chrome", "96.0.4664.45").iterdir()], ["929500"])
+
+
+def test_put_replaces_orphaned_directory():
+    with mktempdir() as tmpdir:
+        orphan = Path(tmpdir, "drivers", "chromedriver", "96.0.4664.45")
+        orphan.mkdir(parents=True)
+        orphan.joinpath("partial").write_bytes(b"")
+        zip_path = Path(tmpdir, "chromedriver_linux64.zip")
+        zip_path.write_bytes(make_zip({"chromedriver": b"#!/bin/sh\n"}))
+
+        binary_path = DriverCache("chromedriver", tmpdir).put(zip_path, "96.0.4664.45")
+        assert_true(binary_path.exists())
+        assert_equal(sorted(p.name for p in orphan.iterdir()), ["chromedriver"])
+        assert_equal(DriverCache("chromedriver", tmpdir).get("96.0.4664.45"), binary_path)
+        assert_equal([p.name for p in orphan.parent.iterdir()], ["96.0.4664.45"])
+
+
+def test_sqlite_metadata_migrates_json():
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "chromedriver_linux64.zip")
+        zip_path.write_bytes(make_zip({"chromedriver": b"#!/bin/sh\n"}))
+        binary_path = DriverCache("chromedriver", tmpdir).put(zip_path, "96.0.4664.45")
+        metadata = json.loads(Path(tmpdir, "drivers.json").read_text())
+        legacy = Path(tmpdir, "drivers", "chromedriver", "95.0.4638.69", "chromedriver")
+        legacy.parent.mkdir()
+        legacy.write_bytes(b"#!/bin/sh\n")
+        metadata["chromedriver_95.0.4638.69"] = {"timestamp": "01/01/2022", "binary_path": str(legacy)}
+        Path(tmpdir, "drivers.json").write_text(json.dumps(metadata))
+
+        cache = DriverCache("chromedriver", tmpdir, metadata="sqlite")
+        assert_true(Path(tmpdir, "metadata.db").exists())
+        assert_true(not Path(tmpdir, "drivers.json").exists())
+        assert_equal(cache.get("96.0.4664.45"), binary_path)
+        assert_equal(cache.get("95.0.4638.69"), legacy)
+
+        store = SqliteMetadataStore(Path(tmpdir, "metadata.db"), "drivers")
+        entry = store.get("chromedriver", "96.0.4664.45")
+        assert_equal(entry["size"], len(b"#!/bin/sh\n"))
+        assert_equal(len(entry["hash"]), 64)
+        store.update({"last_access": 1.0}, "chromedriver", "96.0.4664.45")
+        assert_equal(store.get("chromedriver", "96.0.4664.45")["last_access"], 1.0)
+        store.remove("chromedriver", "95.0.4638.69")
+        assert_equal([key for key, _ in store.items()], [("chromedriver", "96.0.4664.45", None)])
+
+
+def test_dedupe_hardlinks_identical_files_across_revisions():
+    shared = {"chrome-linux/chrome": b"#!/bin/sh\n", "chrome-linux/locales/en-US.pak": b"l" * 4096}
+    with mktempdir() as tmpdir:
+        cache = BrowserCache("chrome", tmpdir, dedupe=True)
+        paths = {}
+        for revision, extra in [("929500", b"a" * 100), ("929512", b"b" * 100)]:
+            zip_path = Path(tmpdir, f"{revision}.zip")
+            zip_path.write_bytes(make_zip({**shared, "chrome-linux/resources.pak": extra}))
+            paths[revision] = cache.put(zip_path, "96.0.4664.45", revision).parent
+
+        locale_a, locale_b = (paths[r].joinpath("locales", "en-US.pak") for r in ("929500", "929512"))
+        assert_true(os.path.samefile(locale_a, locale_b))
+        assert_true(not os.path.samefile(paths["929500"] / "resources.pak", paths["929512"] / "resources.pak"))
+
+        store = ContentStore(tmpdir)
+        report = store.report()
+        assert_equal(report["objects"], 4)
+        assert_equal(report["saved_bytes"], 4096 + len(b"#!/bin/sh\n"))
+
+        shutil.rmtree(paths["929500"].parent)
+        assert_equal(locale_b.read_bytes(), b"l" * 4096)
+        assert_equal(store.prune(), 100)
+        assert_equal(store.report()["saved_bytes"], 0)
+        assert_equal(locale_b.read_bytes(), b"l" * 4096)
+
+
+def test_install_hashes_files_once(monkeypatch):
+    def unexpected(*args):
+        raise AssertionError("extracted files were read again")
+
+    with mktempdir() as tmpdir:
+        cache = BrowserCache("chrome", tmpdir, dedupe=True)
+        zip_path = Path(tmpdir, "929500.zip")
+        zip_path.write_bytes(make_zip({"chrome-linux/chrome": b"#!/bin/sh\n", "chrome-linux/locales/en-US.pak": b"l"}))
+        monkeypatch.setattr("smart_webdriver_manager.cache.tree_digest", unexpected)
+        monkeypatch.setattr(ContentStore, "_content_digest", staticmethod(unexpected))
+        binary_path = cache.put(zip_path, "96.0.4664.45", "929500")
+        monkeypatch.undo()
+        entry = cache.entry("96.0.4664.45", "929500")
+        assert_equal(entry["tree_hash"], tree_digest(binary_path.parents[1]))
+        assert_equal(ContentStore(tmpdir).report()["objects"], 2)
+
+
+def test_evicts_least_recently_used_to_fit_budget():
+    payload = {"chrome-linux/chrome": b"#!/bin/sh\n" + b"x" * 990}
+    with mktempdir() as tmpdir:
+        cache = BrowserCache("chrome", tmpdir)
+        for i, revision in enumerate(["929500", "929501", "929502"]):
+            zip_path = Path(tmpdir, f"{revision}.zip")
+            zip_path.write_bytes(make_zip(payload))
+            cache.put(zip_path, f"96.0.4664.4{i}", revision)
+            cache._metadata.update({"last_access": 100.0 + i}, "chrome", f"96.0.4664.4{i}", revision)
+        cache.get("96.0.4664.40", "929500")  # oldest becomes most recent
+        Path(tmpdir, "browsers", "chrome", "96.0.4664.41", "UserData").mkdir()
+
+        removed = cache.evict(max_size=1000)
+        assert_equal(removed, [("chrome", "96.0.4664.41", "929501"), ("chrome", "96.0.4664.42", "929502")])
+        assert_equal([p.name for p in Path(tmpdir, "browsers", "chrome").iterdir()], ["96.0.4664.40"])
+        assert_true(cache.get("96.0.4664.40", "929500"))
+        assert_equal(cache.evict(max_age=3600), [])
+        assert_equal(cache.evict(max_size=0), [("chrome", "96.0.4664.40", "929500")])
+        assert_equal(list(Path(tmpdir, "browsers", "chrome").iterdir()), [])
+
+
+def test_evict_skips_running_browser_and_locked_artifacts():
+    with mktempdir() as tmpdir:
+        cache = BrowserCache("chrome", tmpdir)
+        drivers = DriverCache("chromedriver", tmpdir)
+        zip_path = Path(tmpdir, "chrome.zip")
+        zip_path.write_bytes(make_zip({"chrome-linux/chrome": b"#!/bin/sh\n"}))
+        cache.put(zip_path, "96.0.4664.45", "929500")
+        zip_path.write_bytes(make_zip({"chromedriver": b"#!/bin/sh\n"}))
+        drivers.put(zip_path, "96.0.4664.45")
+
+        user_data = Path(tmpdir, "browsers", "chrome", "96.0.4664.45", "UserData")
+        user_data.mkdir()
+        os.symlink("host-1234", user_data / "SingletonLock")
+        assert_equal(cache.evict(max_size=0), [])
+        user_data.joinpath("SingletonLock").unlink()
+        assert_equal(cache.evict(max_size=0), [("chrome", "96.0.4664.45", "929500")])
+        assert_true(not user_data.parent.exists())
+
+        with drivers.lock("96.0.4664.45"):
+            assert_equal(drivers.evict(max_size=0), [])
+        assert_true(drivers.remove("96.0.4664.45"))
+        assert_equal(drivers.get("96.0.4664.45"), None)
+
+
+def test_drivers_in_use_are_kept():
+    with mktempdir() as tmpdir:
+        drivers = DriverCache("chromedriver", tmpdir)
+        zip_path = Path(tmpdir, "chromedriver.zip")
+        zip_path.write_bytes(make_zip({"chromedriver": b"#!/bin/sh\n"}))
+        drivers.put(zip_path, "96.0.4664.45")
+
+        first, second = drivers.use("96.0.4664.45"), drivers.use("96.0.4664.45")
+        assert_equal(drivers.evict(max_size=0), [])
+        first.release()
+        assert_equal(drivers.remove("96.0.4664.45"), False)
+        assert_equal(drivers.collect_garbage(grace=0), 0)
+        second.release()
+        assert_equal(list(Path(tmpdir, "locks").glob("*.use")), [])
+
+        crashed = Path(tmpdir, "locks", "chromedriver_96.0.4664.45@0.use")
+        crashed.touch()  # left by a process that died holding it
+        assert_equal(drivers.evict(max_size=0), [("chromedriver", "96.0.4664.45", None)])
+        drivers.collect_garbage(grace=0)
+        assert_true(not crashed.exists())
+
+
+def test_collect_garbage_removes_interrupted_installs():
+    with mktempdir() as tmpdir:
+        cache = DriverCache("chromedriver", tmpdir, dedupe=True)
+        zip_path = Path(tmpdir, "chromedriver_linux64.zip")
+        zip_path.write_bytes(make_zip({"chromedriver": b"#!/bin/sh\n"}))
+        binary_path = cache.put(zip_path, "96.0.4664.45")
+        binary_path.parent.joinpath("chromedriver_linux64.zip").write_bytes(b"z" * 10)
+
+        root = Path(tmpdir, "drivers", "chromedriver")
+        stale, fresh = root / ".staging-stale", root / "95.0.4638.69"
+        for path in (stale, fresh):
+            path.mkdir()
+            path.joinpath("partial").write_bytes(b"p" * 100)
+        os.utime(stale, (0, 0))
+        assert_equal(cache.collect_garbage(), 10 + 100)
+        assert_equal(sorted(p.name for p in root.iterdir()), ["95.0.4638.69", "96.0.4664.45"])
+
+        assert_true(cache.remove("96.0.4664.45"))
+        assert_equal(cache.collect_garbage(grace=0), 100 + len(b"#!/bin/sh\n"))
+        assert_equal(list(root.iterdir()), [])
+
+
+def make_profile(path):
+    files = {
+        "Local State": b"{}",
+        "Default/Preferences": b"{}",
+        "Default/Cookies": b"c" * 1024,
+        "Default/Extensions/abc/1.0/manifest.json": b"{}",
+    }
+    for name, data in files.items():
+        Path(path, name).parent.mkdir(parents=True, exist_ok=True)
+        Path(path, name).write_bytes(data)
+    os.symlink("host-1234", Path(path, "SingletonLock"))
+
+
+def test_clone_tree_shares_only_immutable_files():
+    with mktempdir() as tmpdir:
+        src, dst = Path(tmpdir, "src"), Path(tmpdir, "dst")
+        make_profile(src)
+        method = clone_tree(
+            src, dst, link=lambda rel: "Extensions" in rel.parts, exclude=lambda rel: rel.name.startswith("Singleton")
+        )
+        assert_true(method in ("reflink", "hardlink"))
+        assert_true(not os.path.lexists(dst / "SingletonLock"))
+        assert_equal(dst.joinpath("Default", "Cookies").read_bytes(), b"c" * 1024)
+        if method == "hardlink":
+            manifest = Path("Default", "Extensions", "abc", "1.0", "manifest.json")
+            assert_true(os.path.samefile(src / manifest, dst / manifest))
+        dst.joinpath("Default", "Cookies").write_bytes(b"changed")
+        assert_equal(src.joinpath("Default", "Cookies").read_bytes(), b"c" * 1024)
+
+
+def test_user_data_pool_hands_out_private_clones():
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "chrome.zip")
+        zip_path.write_bytes(make_zip({"chrome-linux/chrome": b"#!/bin/sh\n"}))
+        BrowserCache("chrome", tmpdir).put(zip_path, "96.0.4664.45", "929500")
+        cache = BrowserUserDataCache("chrome", tmpdir)
+        make_profile(cache.get("96.0.4664.45", "929500"))
+        sessions = Path(tmpdir, "browsers", "chrome", "96.0.4664.45", "Sessions")
+
+        with cache.pool("96.0.4664.45", "929500", size=2) as pool:
+            with pool.session() as first, pool.session() as second:
+                assert_true(first != second)
+                assert_equal(first.joinpath("Default", "Preferences").read_bytes(), b"{}")
+                first.joinpath("Default", "Preferences").write_bytes(b"dirty")
+                os.symlink("host-1", first / "SingletonLock")
+                assert_equal(BrowserCache("chrome", tmpdir).evict(max_size=0), [])
+            assert_true(not first.exists())
+            with pool.session() as third:
+                assert_equal(third.joinpath("Default", "Preferences").read_bytes(), b"{}")
+        assert_equal(list(sessions.iterdir()), [])
+
+        with cache.clone("96.0.4664.45", "929500") as path:
+            assert_true(path.joinpath("Local State").exists())
+        assert_true(not path.exists())
+
+
+def test_corrupt_artifacts_are_detected_and_fetched_again():
+    with FakeChromeServer() as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        binary_path = cx.get_browser("96.0.4664.45", "929500")
+        entry = cx._browser_cache.entry("96.0.4664.45", "929500")
+        assert_equal(len(entry["tree_hash"]), 64)
+        assert_equal(entry["hash"], hashlib.sha256(server.browser_zip).hexdigest())
+
+        os.utime(binary_path)  # touched, content unchanged: re-hashed once, fingerprint refreshed
+        assert_equal(cx._browser_cache.get("96.0.4664.45", "929500"), binary_path)
+        assert_true(cx._browser_cache.entry("96.0.4664.45", "929500")["fingerprint"] != entry["fingerprint"])
+
+        resources = binary_path.parent.joinpath("resources.pak")
+        st = resources.stat()
+        resources.write_bytes(b"y" * st.st_size)  # same size, binary untouched: only a full verify sees it
+        assert_equal(cx._browser_cache.get("96.0.4664.45", "929500"), binary_path)
+        assert_true(not cx._browser_cache.verify("96.0.4664.45", "929500"))
+        assert_true(not binary_path.exists())
+        assert_equal(cx.get_browser("96.0.4664.45", "929500"), binary_path)
+        assert_equal(server.count("GET", "/browser"), 2)
+
+        binary_path.write_bytes(b"trunc")  # truncated binary: caught by the fingerprint
+        assert_equal(cx.get_browser("96.0.4664.45", "929500"), binary_path)
+        assert_equal(server.count("GET", "/browser"), 3)
+        assert_true(cx._browser_cache.verify("96.0.4664.45", "929500"))
+        cx.close()
+
+
+def test_shared_tier_is_promoted_without_writing_to_it():
+    with FakeChromeServer() as server, mktempdir() as shared, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(shared, metadata="sqlite"))
+        cx.get_driver("96.0.4664.45")
+        cx.get_browser("96.0.4664.45", "929500")
+        cx.close()
+        before = sorted((str(p), p.stat().st_mtime_ns) for p in Path(shared).rglob("*") if "locks" not in p.parts)
+        downloads = server.count("GET")
+
+        cx = server.configure(SmartChromeContextManager(tmpdir, shared=[shared]))
+        driver = cx.get_driver("96.0.4664.45")
+        browser = cx.get_browser("96.0.4664.45", "929500")
+        assert_equal(server.count("GET"), downloads)
+        assert_equal(driver, Path(tmpdir, "drivers", "chromedriver", "96.0.4664.45", "chromedriver"))
+        assert_equal(browser, Path(tmpdir, "browsers", "chrome", "96.0.4664.45", "929500", "chrome-linux", "chrome"))
+        entry = cx._browser_cache.entry("96.0.4664.45", "929500")
+        assert_equal(entry["hash"], hashlib.sha256(server.browser_zip).hexdigest())
+        assert_true(cx._browser_cache.verify("96.0.4664.45", "929500"))
+        after = sorted((str(p), p.stat().st_mtime_ns) for p in Path(shared).rglob("*") if "locks" not in p.parts)
+        assert_equal(after, before)
+        cx.close()
+
+        Path(shared, "drivers", "chromedriver", "96.0.4664.45", "chromedriver").write_bytes(b"corrupt")
+        cx = server.configure(SmartChromeContextManager(Path(tmpdir, "other"), shared=[shared]))
+        assert_equal(cx.get_driver("96.0.4664.45").read_bytes(), b"#!/bin/sh\n")
+        assert_equal(server.count("GET", "/driver/96"), 2)
+        cx.close()
+
+
+def test_revision_index_floor_and_merge():
+    with mktempdir() as tmpdir:
+        index = RevisionIndex("Linux_x64", tmpdir)
+        index.add([100, 110], complete=[(110, 120)])
+        assert_equal(index.floor(115), 110)
+        assert_equal(index.floor(125), None)  # not covered
+        assert_equal(index.floor(105), None)
+        assert_equal((index.known(100), index.known(115), index.known(105)), (True, False, None))
+
+        index.add([100], complete=[(100, 104), (105, 109)])
+        assert_equal(index.floor(105), 100)
+        reloaded = RevisionIndex("Linux_x64", tmpdir)
+        assert_equal(reloaded.floor(120), 110)
+        assert_equal(len(reloaded), 2)
+        assert_equal(RevisionIndex("Win_x64", tmpdir).floor(120), None)
+        assert_equal(json.loads(Path(tmpdir, "revisions.json").read_text())["Linux_x64"]["complete"], [[100, 120]])
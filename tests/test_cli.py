@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import mock
+import pytest
+from asserts import assert_equal, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.cli import main, parse_versions
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+
+def test_parse_versions():
+    assert_equal(parse_versions(["94-96", "0", "95"]), [94, 95, 96, 0])
+    assert_equal(parse_versions([">=90,<96", "latest-cached", "~95"]), [">=90,<96", "latest-cached", "~95"])
+    with pytest.raises(ValueError):
+        parse_versions(["96-94"])
+    with pytest.raises(ValueError):
+        parse_versions(["latest"])
+
+
+def test_prefetch_writes_lockfile_that_skips_resolution(capsys):
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69"}
+    positions = {"96.0.4664.45": 929512, "95.0.4638.69": 920003}
+    revisions = [*range(929400, 929513), *range(919900, 920004)]
+    with FakeChromeServer(releases, positions, revisions) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        lockfile = Path(tmpdir, "swm.lock")
+        with mock.patch("smart_webdriver_manager.driver.SmartChromeContextManager", return_value=cx):
+            assert_equal(main(["prefetch", "95-96", "--base-path", str(tmpdir), "--lockfile", str(lockfile)]), 0)
+        printed = json.loads(capsys.readouterr().out)
+        versions = json.loads(lockfile.read_text())["versions"]
+        assert_equal(printed, versions)
+        assert_equal(versions["96"]["revision"], "929512")
+        assert_true(Path(versions["95"]["browser"]).exists())
+
+        with mktempdir() as other:
+            resolutions = len(server.requests)
+            cdm = ChromeDriverManager(version=96, base_path=other, lockfile=lockfile)
+            server.configure(cdm._cx)
+            assert_true(Path(cdm.get_browser()).exists())
+            assert_equal(Path(cdm.get_driver()).name, "chromedriver")
+            fetched = [path for _, path in server.requests[resolutions:]]
+            assert_true(all(path.startswith(("/driver/96.", "/browser/")) for path in fetched))
+
+
+def test_verify_removes_corrupt_installs(capsys):
+    with FakeChromeServer() as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        driver = cx.get_driver("96.0.4664.45")
+        browser = cx.get_browser("96.0.4664.45", "929500")
+        cx.close()
+        assert_equal(main(["verify", "--base-path", str(tmpdir)]), 0)
+        browser.write_bytes(b"x")
+        assert_equal(main(["verify", "--base-path", str(tmpdir)]), 1)
+        assert_equal(capsys.readouterr().out, "removed corrupt chrome/96.0.4664.45/929500\n")
+        assert_true(driver.exists() and not browser.exists())
+
+
+def test_export_and_import_bundle(capsys):
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69"}
+    positions = {"96.0.4664.45": 929512, "95.0.4638.69": 920003}
+    revisions = [*range(929400, 929513), *range(919900, 920004)]
+    with FakeChromeServer(releases, positions, revisions) as server, mktempdir() as tmpdir, mktempdir() as other:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        for version in (95, 96):
+            cx.get_browser(*(str(v) for v in cx.get_browser_release(version)))
+            cx.get_driver(str(cx.get_driver_release(version)))
+        bundle = str(Path(tmpdir, "swm.tar.gz"))
+        assert_equal(main(["export", bundle, "95", "--base-path", str(tmpdir)]), 0)
+        assert_equal(main(["import", bundle, "--base-path", str(other)]), 0)
+        assert_equal(
+            capsys.readouterr().out.splitlines(),
+            [
+                "exported chromedriver 95.0.4638.69",
+                "exported chrome 95.0.4638.69 920003",
+                "imported chromedriver 95.0.4638.69",
+                "imported chrome 95.0.4638.69 920003",
+            ],
+        )
+        assert_equal(SmartChromeContextManager(other).get_installed_releases(), [("95.0.4638.69", "920003")])
+        assert_equal(main(["export", bundle, "94", "--base-path", str(tmpdir)]), 1)
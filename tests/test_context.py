@@ -0,0 +1,208 @@
+import random
+
+import pytest
+from asserts import assert_equal, assert_less_equal, assert_in, assert_true
+from pathlib import Path
+
+from smart_webdriver_manager.context import (
+    SEARCH_BATCH,
+    SEARCH_DEPTH,
+    SmartChromeContextManager,
+    parse_version_spec,
+    search_revision,
+    spec_majors,
+)
+from smart_webdriver_manager.download import make_session
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+
+@pytest.mark.parametrize(
+    "revisions, expected",
+    [
+        (range(929400, 929513), 929512),
+        (range(929400, 929512), 929511),
+        (range(928000, 929001), 929000),
+        (range(929509, 925000, -10), 929509),
+        (range(929505, 925000, -7), 929505),
+        (range(929500, 925000, -12), 929500),
+        ([*range(928000, 929001), 929300], 929300),
+    ],
+)
+def test_find_browser_revision(revisions, expected):
+    probes = []
+    with FakeChromeServer(revisions=revisions) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir, probe_counter=probes.append))
+        release, revision = cx.get_browser_release(96)
+        assert_equal(str(release), "96.0.4664.45")
+        assert_equal(int(str(revision)), expected)
+        assert_equal(len(probes), server.count("HEAD", "/browser"))
+        assert_less_equal(len(probes), 2 * (929512 - expected) + SEARCH_BATCH)
+
+
+@pytest.mark.parametrize("density", [0.2, 0.05])
+def test_find_browser_revision_in_sparse_snapshots(density):
+    with FakeChromeServer() as server:
+        for seed in range(20):
+            rng = random.Random(seed)
+            server.revisions = {r for r in range(925000, 929600) if rng.random() < density}
+            with mktempdir() as tmpdir:
+                cx = server.configure(SmartChromeContextManager(tmpdir))
+                assert_equal(cx.find_browser_revision(929512), max(r for r in server.revisions if r <= 929512))
+
+
+def search(revisions, revision, depth):
+    """Drive `search_revision` against a set of revisions, returns (found, probes)"""
+    probes, gen = [], search_revision(revision, depth)
+    try:
+        batch = next(gen)
+        while True:
+            probes += batch
+            batch = gen.send([r for r in batch if r in revisions])
+    except StopIteration as stop:
+        return stop.value, probes
+
+
+def test_search_revision_stops_at_the_search_depth():
+    """A snapshot several milestones back is not a build of this one"""
+    assert_equal(search({900}, 1000, 100), (900, list(range(1000, 899, -1))))
+    with pytest.raises(ValueError):
+        search({899}, 1000, 100)
+    found, probes = search({10}, 1000, SEARCH_DEPTH)
+    assert_equal(found, 10)
+    assert_equal(sorted(probes), list(range(10, 1001)))
+
+
+@pytest.mark.parametrize(
+    "text, majors, matches",
+    [
+        ("<=95", (None, 95), ["94.0.4606.61", "95.0.4638.69"]),
+        ("==95", (95, 95), ["95.0.4638.69"]),
+        (">95", (96, None), ["96.0.4664.45"]),
+        ("!=95,>=94", (94, None), ["94.0.4606.61", "96.0.4664.45"]),
+        ("==95.0.4638.69", (95, 95), ["95.0.4638.69"]),
+    ],
+)
+def test_version_specs_on_bare_majors_cover_the_major(text, majors, matches):
+    spec = parse_version_spec(text)
+    assert_equal(spec_majors(spec), majors)
+    releases = ["94.0.4606.61", "95.0.4638.69", "96.0.4664.45"]
+    assert_equal([release for release in releases if spec.contains(release)], matches)
+
+
+def test_find_browser_revision_missing():
+    with FakeChromeServer(revisions=[]) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        with pytest.raises(ValueError) as ex:
+            cx.find_browser_revision(64)
+        assert_in("no chromium snapshot", ex.value.args[0])
+
+
+def test_resolution_cache_warm_run_is_offline():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        resolved = cx.get_browser_release(96)
+        requests_made = len(server.requests)
+
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        assert_equal(cx.get_driver_release(96), resolved[0])
+        assert_equal(cx.get_browser_release(96), resolved)
+        assert_equal(len(server.requests), requests_made)
+
+        cx = SmartChromeContextManager(tmpdir, offline=True)
+        assert_equal(cx.get_browser_release(96), resolved)
+        with pytest.raises(ValueError) as ex:
+            cx.get_driver_release(95)
+        assert_in("offline", ex.value.args[0])
+
+
+def test_resolution_cache_stale_while_revalidate():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir, resolution_ttl=0))
+        release, _ = cx.get_browser_release(0)
+        assert_equal(str(release), "96.0.4664.45")
+
+        server.releases[0] = "97.0.4692.20"
+        server.positions["97.0.4692.20"] = 929512
+        release, _ = cx.get_browser_release(0)
+        assert_equal(str(release), "96.0.4664.45")
+        cx._revalidating[0].join()
+        release, _ = server.configure(SmartChromeContextManager(tmpdir)).get_browser_release(0)
+        assert_equal(str(release), "97.0.4692.20")
+
+
+def test_shared_session_reuses_connections():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        session = make_session(pool_size=1)
+        cx = server.configure(SmartChromeContextManager(tmpdir, session=session))
+        release, revision = cx.get_browser_release(96)
+        assert_true(Path(cx.get_driver(str(release))).exists())
+        assert_true(Path(cx.get_browser(str(release), str(revision))).exists())
+        assert_equal(server.connections, 1)
+        cx.close()
+        session.close()
+
+
+def test_mirrors_are_tried_before_the_origin():
+    origin, mirror = FakeChromeServer(revisions=range(929400, 929513)), FakeChromeServer(revisions=[1])
+    with origin, mirror, mktempdir() as tmpdir:
+        cx = SmartChromeContextManager(
+            tmpdir,
+            mirrors=[mirror.url],
+            url_driver_repo=f"{origin.url}/driver",
+            url_browser_repo=f"{origin.url}/browser",
+            url_browser_deps=f"{origin.url}/deps.json",
+        )
+        release, revision = cx.get_browser_release(96)
+        assert_true(Path(cx.get_driver(str(release))).exists())
+        assert_true(Path(cx.get_browser(str(release), str(revision))).exists())
+        assert_equal(mirror.count("GET", "/chromedriver/96.0.4664.45"), 1)
+        assert_equal(origin.count("GET", "/driver/96.0.4664.45"), 0)
+        assert_equal(mirror.count("GET", "/chromium-browser-snapshots"), 1)  # 404, falls through
+        assert_equal(origin.count("GET", "/browser"), 1)
+        cx.close()
+
+
+def test_revision_index_reuses_probes():
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69"}
+    positions = {"96.0.4664.45": 929512, "95.0.4638.69": 929501}
+    with FakeChromeServer(releases, positions, range(929400, 929501)) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        assert_equal(str(cx.get_browser_release(96)[1]), "929500")
+        probes = server.count("HEAD", "/browser")
+        assert_true(probes > 0)
+
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        assert_equal(str(cx.get_browser_release(95)[1]), "929500")  # 929501 and 929500 were probed
+        assert_equal(server.count("HEAD", "/browser"), probes)
+
+
+def test_revision_index_records_the_scanned_range():
+    revisions = [*range(928000, 929001), 929300]
+    with FakeChromeServer(revisions=revisions) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        assert_equal(cx.find_browser_revision(929512), 929300)
+        assert_equal(cx._revision_index.floor(929400), 929300)
+        assert_equal(cx._revision_index.floor(929299), None)  # below the scan
+
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        probes = server.count("HEAD", "/browser")
+        assert_equal(cx.find_browser_revision(929450), 929300)
+        assert_equal(server.count("HEAD", "/browser"), probes)
+        assert_equal(cx.find_browser_revision(929299), 929000)
+
+
+def test_revision_index_from_bucket_listing():
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69"}
+    positions = {"96.0.4664.45": 929500, "95.0.4638.69": 920003}
+    revisions = [*range(929400, 929501, 7), *range(919000, 920000, 3)]
+    with FakeChromeServer(releases, positions, revisions) as server, mktempdir() as tmpdir:
+        server.list_page_size = 100
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        assert_equal(cx.refresh_revision_index(), len(revisions))
+        assert_equal(server.count("GET", "/list"), -(-len(revisions) // 100))
+        assert_equal(str(cx.get_browser_release(95)[1]), "919999")
+        assert_equal(server.count("HEAD", "/browser"), 0)
+        assert_equal(str(cx.get_browser_release(96)[1]), "929498")
+        assert_equal(server.count("HEAD", "/browser"), 2)  # 929500, 929499: above the listing
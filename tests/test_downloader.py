@@ -1,9 +1,16 @@
+import hashlib
 import os
+import zipfile
 import pytest
+import requests
 from pathlib import Path
-from asserts import assert_equal
+from asserts import assert_equal, assert_true
 
-from smart_webdriver_manager.utils import download_file, unpack_zip
+from smart_webdriver_manager.cache import tree_digest, tree_digest_of
+from smart_webdriver_manager.download import RESTART_ATTEMPTS, download_file, make_session
+from smart_webdriver_manager.utils import StreamDigest, mktempdir, unpack_zip
+
+from fakeserver import LOCALES, FakeChromeServer, make_chromium_zip, make_zip
 
 
 def test_can_download_driver_as_zip_file():
@@ -15,5 +22,116 @@ def test_can_download_driver_as_zip_file():
         assert_equal(files, ["chromedriver.exe"])
 
 
+PAYLOAD = os.urandom(2 * 1024 * 1024 + 123)
+
+
+def check_download(server, **kwargs):
+    with download_file(f"{server.url}/files/chrome.zip", **kwargs) as f:
+        assert_equal(Path(f).read_bytes(), PAYLOAD)
+
+
+def test_ranged_download_is_parallel():
+    with FakeChromeServer() as server:
+        server.files["chrome.zip"] = PAYLOAD
+        server.bandwidth = 4 * 1024 * 1024
+        check_download(server, part_size=256 * 1024, max_workers=8)
+        assert_equal(server.count("GET", "/files"), 9)
+        assert_true(server.concurrency("GET", "/files") >= 4)
+
+
+@pytest.mark.parametrize("part_size", [256 * 1024, 64 * 1024 * 1024])
+def test_download_resumes_after_dropped_connection(part_size):
+    with FakeChromeServer() as server, make_session(retries=0) as session:
+        server.files["chrome.zip"] = PAYLOAD
+        server.drops = {"/files": 3}
+        check_download(server, session=session, part_size=part_size)
+        ranged = [p for m, p in server.requests if m == "GET"]
+        assert_equal(len(ranged), 4 if part_size > len(PAYLOAD) else 9 + 3)
+
+
+def test_download_without_ranges_uses_single_stream():
+    with FakeChromeServer() as server:
+        server.files["chrome.zip"] = PAYLOAD
+        server.ranges = False
+        check_download(server, part_size=256 * 1024)
+        assert_equal(server.count("GET", "/files"), 1)
+        server.drops = {"/files": RESTART_ATTEMPTS - 1}
+        check_download(server, part_size=256 * 1024)
+        assert_equal(server.count("GET", "/files"), 1 + RESTART_ATTEMPTS)
+        server.drops = {"/files": RESTART_ATTEMPTS}
+        with pytest.raises(requests.exceptions.RequestException):
+            check_download(server, part_size=256 * 1024)
+
+
+@pytest.mark.parametrize("part_size,drops", [(256 * 1024, 0), (256 * 1024, 3), (64 * 1024 * 1024, 2)])
+def test_download_hashes_while_streaming(part_size, drops):
+    with FakeChromeServer() as server, make_session(retries=0) as session:
+        server.files["chrome.zip"] = PAYLOAD
+        server.drops = {"/files": drops}
+        digest = StreamDigest()
+        with download_file(f"{server.url}/files/chrome.zip", session, part_size=part_size, digest=digest) as f:
+            assert_equal(digest.hexdigest(), hashlib.sha256(Path(f).read_bytes()).hexdigest())
+        assert_equal(digest.hexdigest(), hashlib.sha256(PAYLOAD).hexdigest())
+
+
+def test_unpack_zip_digests_match_the_tree():
+    files = {"a.txt": b"1", "a/b/x": b"2", "a/c": b"3", "a-b/y": b"4", "b": b"5", "a/b/c/z": b"6"}
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "tree.zip")
+        zip_path.write_bytes(make_zip(files))
+        digests = {}
+        unpack_zip(zip_path, digests=digests)
+        zip_path.unlink()
+        assert_equal(digests, {name: hashlib.sha256(data).hexdigest() for name, data in files.items()})
+        assert_equal(tree_digest_of(digests), tree_digest(tmpdir))
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_unpack_zip_keeps_permissions_and_applies_profile(max_workers):
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "chrome-linux.zip")
+        make_chromium_zip(zip_path, scale=0.001)
+        full = unpack_zip(zip_path, max_workers=max_workers)
+        assert_equal(len(full), 5 + len(LOCALES))
+        if os.name != "nt":
+            assert_true(os.access(Path(tmpdir, "chrome-linux", "chrome"), os.X_OK))
+
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "chrome-linux.zip")
+        make_chromium_zip(zip_path, scale=0.001)
+        headless = unpack_zip(zip_path, "headless", max_workers=max_workers)
+        assert_equal(sorted(p.name for p in Path(tmpdir, "chrome-linux", "locales").iterdir()), ["en-US.pak"])
+        assert_equal(len(headless), 5 + 1)
+        with pytest.raises(ValueError):
+            unpack_zip(zip_path, "tiny")
+
+
+def test_unpack_zip_stays_in_its_directory():
+    files = {"../escaped_dir/": b"", "../other/file": b"1", "/abs/file": b"2", "ok/./file": b"3", "../": b""}
+    with mktempdir() as tmpdir:
+        staging = Path(tmpdir, "stage")
+        staging.mkdir()
+        zip_path = staging.joinpath("hostile.zip")
+        zip_path.write_bytes(make_zip(files))
+        names = unpack_zip(zip_path)
+        zip_path.unlink()
+        assert_equal(sorted(names), ["abs/file", "escaped_dir/", "ok/file", "other/file"])
+        assert_equal(sorted(p.name for p in Path(tmpdir).iterdir()), ["stage"])
+        assert_equal(staging.joinpath("other", "file").read_bytes(), b"1")
+        assert_true(staging.joinpath("escaped_dir").is_dir())
+
+
+def test_unpack_zip_raises_on_corrupt_members():
+    with mktempdir() as tmpdir:
+        zip_path = Path(tmpdir, "corrupt.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr("chromedriver", b"#!/bin/sh\n")
+        data = bytearray(zip_path.read_bytes())
+        data[data.index(b"#!/bin/sh")] ^= 0xFF  # the CRC no longer matches
+        zip_path.write_bytes(bytes(data))
+        with pytest.raises(zipfile.BadZipFile):
+            unpack_zip(zip_path)
+
+
 if __name__ == "__main__":
     pytest.main(args=["-s", __file__])
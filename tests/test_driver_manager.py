@@ -0,0 +1,158 @@
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import mock
+import pytest
+from asserts import assert_equal, assert_false, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.download import make_session
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+
+def fake_manager(server, tmpdir, version=96, **kwargs):
+    cdm = ChromeDriverManager(version=version, base_path=tmpdir, **kwargs)
+    server.configure(cdm._cx)
+    return cdm
+
+
+def test_driver_and_browser_download_concurrently():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        server.latency = {"/driver/96": 0.5, "/browser": 0.5}
+        cdm = fake_manager(server, tmpdir)
+        driver_path = Path(cdm.get_driver())
+        browser_path = Path(cdm.get_browser())
+        user_data_path = Path(cdm.get_browser_user_data())
+        assert_equal(server.concurrency("GET", ("/driver/96.", "/browser")), 2)
+        assert_true(driver_path.exists())
+        assert_true(browser_path.exists())
+        assert_true(user_data_path.is_dir())
+        assert_equal(server.count("GET", "/driver/96"), 1)
+        assert_equal(server.count("GET", "/browser"), 1)
+        assert_equal(list(Path(tmpdir).rglob("*.zip")), [])
+        assert_equal(list(Path(tmpdir).rglob(".staging-*")), [])
+
+
+@pytest.mark.parametrize("order", [("get_browser_user_data", "get_browser", "get_driver"), ("get_browser", "get_driver", "get_browser_user_data")])
+def test_order_doesnt_matter(order):
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        cdm = fake_manager(server, tmpdir)
+        for method in order:
+            assert_true(Path(getattr(cdm, method)()).exists())
+
+
+def test_install_many_deduplicates_releases():
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69", 94: "94.0.4606.61"}
+    positions = {"96.0.4664.45": 929512, "95.0.4638.69": 920003, "94.0.4606.61": 911515}
+    revisions = [*range(929400, 929513), *range(919900, 920004), *range(911400, 911516)]
+    with FakeChromeServer(releases, positions, revisions) as server, mktempdir() as tmpdir:
+        server.latency = {"/driver": 0.2, "/browser": 0.2, "/deps.json?version=94": 0.5}
+        session = make_session()
+        cx = server.configure(SmartChromeContextManager(tmpdir, session=session))
+        with mock.patch("smart_webdriver_manager.driver.SmartChromeContextManager", return_value=cx):
+            installed = ChromeDriverManager.install_many([0, 96, 95, 94, 96], base_path=tmpdir, max_workers=6)
+        # downloads of the resolved releases ran together, before 94 was resolved
+        assert_equal(server.concurrency("GET", ("/driver/9", "/browser")), 4)
+        slowest = max(end for _, path, _, end in server.spans if path.startswith("/deps.json?version=94"))
+        downloads = [start for _, path, start, _ in server.spans if path.startswith(("/driver/96.", "/driver/95."))]
+        assert_true(max(downloads) < slowest)
+        assert_equal(sorted(installed), [0, 94, 95, 96])
+        assert_equal(installed[0], installed[96])
+        assert_equal(server.count("GET", "/driver/9"), 3)
+        assert_equal(server.count("GET", "/browser"), 3)
+        for entry in installed.values():
+            assert_true(all(Path(entry[key]).exists() for key in ("driver", "browser", "user_data")))
+        assert_equal(installed[95]["revision"], "920003")
+        assert_equal(len(installed[95]["browser_hash"]), 64)
+        session.close()
+
+
+def test_warm_lookup_skips_network_and_its_imports():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        expected = fake_manager(server, tmpdir).get_driver()
+        requests_made = len(server.requests)
+        script = (
+            "import sys\n"
+            "from smart_webdriver_manager import ChromeDriverManager\n"
+            f"print(ChromeDriverManager(version=96, base_path={str(tmpdir)!r}).get_driver())\n"
+            "print(sorted(m for m in ('requests', 'urllib3', 'backoff', 'packaging') if m in sys.modules))\n"
+        )
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        assert_equal(out.splitlines(), [expected, "[]"])
+        assert_equal(len(server.requests), requests_made)
+
+
+def test_version_specifiers_prefer_installed_releases():
+    releases = {0: "96.0.4664.45", 96: "96.0.4664.45", 95: "95.0.4638.69", 94: "94.0.4606.61"}
+    positions = {"96.0.4664.45": 929512, "95.0.4638.69": 920003, "94.0.4606.61": 911515}
+    revisions = [*range(929400, 929513), *range(919900, 920004), *range(911400, 911516)]
+    with FakeChromeServer(releases, positions, revisions) as server, mktempdir() as tmpdir:
+        for version in (95, 96):
+            fake_manager(server, tmpdir, version).get_browser()
+        requests_made = len(server.requests)
+
+        assert_true("95.0.4638.69" in fake_manager(server, tmpdir, ">=90,<96").get_driver())
+        assert_true("96.0.4664.45" in fake_manager(server, tmpdir, "latest-cached").get_browser())
+        assert_true("95.0.4638.69" in fake_manager(server, tmpdir, "~95").get_browser_user_data())
+        assert_true("95.0.4638.69" in fake_manager(server, tmpdir, "<=95").get_driver())
+        assert_true("95.0.4638.69" in fake_manager(server, tmpdir, "==95").get_driver())
+        assert_true("96.0.4664.45" in fake_manager(server, tmpdir, ">95").get_driver())
+        assert_equal(len(server.requests), requests_made)
+
+        assert_true("94.0.4606.61" in fake_manager(server, tmpdir, "<95").get_browser())
+        assert_equal(server.count("GET", "/driver/LATEST_RELEASE_94"), 1)
+        assert_equal(server.count("GET", "/driver/LATEST_RELEASE_9"), 3)
+        with pytest.raises(ValueError):
+            fake_manager(server, tmpdir, ">=97").get_driver()
+
+
+def test_managers_of_a_version_share_one_resolution():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        server.latency = {"/driver/LATEST_RELEASE_96": 0.2, "/driver/96": 0.2}
+        managers = [fake_manager(server, tmpdir) for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = set(executor.map(lambda cdm: cdm.get_driver(), managers))
+        assert_equal(len(paths), 1)
+        assert_equal(server.count("GET", "/driver/LATEST_RELEASE_96"), 1)
+        assert_equal(server.count("GET", "/driver/96"), 1)
+        assert_equal(server.count("GET", "/browser"), 1)
+
+        requests_made = len(server.requests)
+        fake_manager(server, tmpdir).get_browser()
+        assert_equal(len(server.requests), requests_made)
+
+
+def test_remove_deletes_the_install_and_forgets_it():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        cdm = fake_manager(server, tmpdir)
+        driver_path, browser_path = Path(cdm.get_driver()), Path(cdm.get_browser())
+        assert_true(cdm.remove())
+        assert_false(driver_path.exists())
+        assert_false(browser_path.exists())
+
+        cdm = fake_manager(server, tmpdir)
+        assert_equal(cdm.get_driver(), str(driver_path))
+        assert_equal(cdm.get_browser(), str(browser_path))
+        assert_equal(server.count("GET", "/driver/96"), 2)
+        assert_equal(server.count("GET", "/browser"), 2)
+
+
+def test_remove_keeps_the_driver_of_a_browser_in_use():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        cdm = fake_manager(server, tmpdir)
+        driver_path, browser_path = Path(cdm.get_driver()), Path(cdm.get_browser())
+        singleton = Path(cdm.get_browser_user_data(), "SingletonLock")
+        singleton.symlink_to("host-1234")  # held by a running chrome
+        assert_false(cdm.remove())
+        assert_true(driver_path.exists())
+        assert_true(browser_path.exists())
+
+        singleton.unlink()
+        assert_true(cdm.remove())
+        assert_false(driver_path.exists())
+        assert_false(browser_path.exists())
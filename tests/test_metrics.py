@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import mock
+from asserts import assert_equal, assert_in, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.cli import main
+from smart_webdriver_manager.context import SmartChromeContextManager
+from smart_webdriver_manager.metrics import Metrics, emit, phase, subscribe
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import FakeChromeServer
+
+
+def install(server, tmpdir):
+    cdm = ChromeDriverManager(version=96, base_path=tmpdir)
+    server.configure(cdm._cx)
+    cdm.get_driver()
+    cdm.get_browser()
+    cdm.invalidate()  # the next install looks up the cache, as in a new process
+
+
+def test_install_phases_and_counters():
+    metrics, events = Metrics(), []
+    unsubscribe = [subscribe(metrics), subscribe(events.append)]
+    try:
+        with FakeChromeServer(revisions=range(929400, 929500)) as server, mktempdir() as tmpdir:
+            install(server, tmpdir)
+            install(server, tmpdir)
+            snapshot = metrics.snapshot()
+            probes = server.count("HEAD", "/browser") - 1  # the download's own HEAD
+    finally:
+        for u in unsubscribe:
+            u()
+
+    phases = snapshot["phases"]
+    assert_equal(sorted(phases), ["download", "lookup_position", "probe_revisions", "resolve_release", "unpack"])
+    assert_equal(phases["download"]["count"], 2)
+    assert_equal(phases["unpack"]["count"], 2)
+    assert_equal(snapshot["cache"]["resolutions"], {"hit": 1, "miss": 2})
+    assert_equal(snapshot["cache"]["drivers"], {"hit": 1, "miss": 1})
+    assert_equal(snapshot["probes"]["found"] + snapshot["probes"]["missing"], probes)
+    assert_true(snapshot["downloads"]["bytes"] > 0)
+    assert_true(all("time" in event for event in events))
+
+    text = metrics.to_prometheus()
+    assert_in('swm_phase_seconds_count{phase="download"} 2', text)
+    assert_in('swm_cache_requests_total{cache="browsers",result="miss"} 1', text)
+    assert_equal(json.loads(metrics.to_json()), snapshot)
+
+
+def test_failed_phase_is_reported():
+    metrics = Metrics()
+    unsubscribe = subscribe(metrics)
+    try:
+        with phase("download", url="x"):
+            pass
+        try:
+            with phase("download", url="y"):
+                raise OSError
+        except OSError:
+            pass
+    finally:
+        unsubscribe()
+    assert_equal(metrics.snapshot()["phases"]["download"]["errors"], 1)
+    emit("cache", cache="drivers", hit=True)
+    assert_equal(metrics.snapshot()["cache"], {})
+
+
+def test_disabled_hooks_are_cheap():
+    with mock.patch("smart_webdriver_manager.metrics.time") as clock:
+        with phase("unpack"):
+            emit("probe", revision=1, found=True)
+    clock.time.assert_not_called()
+    clock.perf_counter.assert_not_called()
+
+
+def test_prefetch_writes_metrics():
+    with FakeChromeServer(revisions=range(929400, 929500)) as server, mktempdir() as tmpdir:
+        cx = server.configure(SmartChromeContextManager(tmpdir))
+        with mock.patch("smart_webdriver_manager.driver.SmartChromeContextManager", return_value=cx):
+            args = ["prefetch", "96", "--base-path", str(tmpdir), "--metrics", str(Path(tmpdir, "m.prom"))]
+            assert_equal(main(args), 0)
+        assert_in('swm_phase_seconds_count{phase="unpack"} 2', Path(tmpdir, "m.prom").read_text())
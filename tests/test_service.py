@@ -0,0 +1,109 @@
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from asserts import assert_equal, assert_true
+
+from smart_webdriver_manager import ChromeDriverManager
+from smart_webdriver_manager.service import DriverServicePool
+from smart_webdriver_manager.utils import mktempdir
+
+from fakeserver import STUB_CHROMEDRIVER, FakeChromeServer, make_stub_chromedriver, make_zip
+
+
+@pytest.fixture
+def stub():
+    with mktempdir() as tmpdir:
+        yield make_stub_chromedriver(Path(tmpdir, "chromedriver"))
+
+
+def test_pool_leases_started_services(stub):
+    with DriverServicePool(stub, size=2) as pool:
+        with pool.lease(timeout=10) as first, pool.lease(timeout=10) as second:
+            assert_true(first.healthy() and second.healthy())
+            assert_true(first.port != second.port)
+        with pool.lease(timeout=10) as again:
+            assert_true(again in (first, second))
+    assert_true(not first.healthy() and not second.healthy())
+
+
+def test_pool_recycles_after_max_sessions(stub):
+    with DriverServicePool(stub, size=1, max_sessions=2) as pool:
+        with pool.lease(timeout=10) as service:
+            pass
+        with pool.lease(timeout=10) as same:
+            assert_equal(same.pid, service.pid)
+        with pool.lease(timeout=10) as replacement:
+            assert_true(replacement.pid != service.pid)
+            assert_equal(replacement.sessions, 0)
+        assert_true(not service.healthy())
+
+
+def test_pool_restarts_unhealthy_services(stub):
+    with DriverServicePool(stub, size=1) as pool:
+        with pool.lease(timeout=10) as service:
+            pass
+        os.kill(service.pid, signal.SIGKILL)
+        with pool.lease(timeout=10) as replacement:
+            assert_true(replacement.healthy())
+            assert_true(replacement.pid != service.pid)
+
+
+def test_lease_times_out_when_driver_never_starts():
+    with mktempdir() as tmpdir:
+        broken = Path(tmpdir, "chromedriver")
+        broken.write_text("#!/bin/sh\nexit 1\n")
+        broken.chmod(0o755)
+        with DriverServicePool(broken, size=1, start_timeout=1) as pool:
+            with pytest.raises(TimeoutError):
+                with pool.lease(timeout=0.5):
+                    pass
+
+
+def test_lease_raises_start_failures_and_pool_recovers(stub):
+    with mktempdir() as tmpdir:
+        driver = Path(tmpdir, "chromedriver")
+        driver.write_text("#!/bin/sh\nexit 1\n")
+        driver.chmod(0o755)
+        with DriverServicePool(driver, size=1, start_timeout=1) as pool:
+            with pytest.raises(TimeoutError) as ex:
+                with pool.lease():
+                    pass
+            assert_true("did not listen" in str(ex.value))
+
+            driver.write_bytes(stub.read_bytes())
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    with pool.lease(timeout=1) as service:
+                        assert_true(service.healthy())
+                    break
+                except TimeoutError:
+                    assert_true(time.monotonic() < deadline)
+                    time.sleep(0.1)
+
+
+def test_manager_pools_its_resolved_driver():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        server.driver_zip = make_zip({"chromedriver": f"#!{sys.executable}\n{STUB_CHROMEDRIVER}".encode()})
+        cdm = ChromeDriverManager(version=96, base_path=tmpdir)
+        server.configure(cdm._cx)
+        with cdm.driver_service_pool(size=1) as pool, pool.lease(timeout=10) as service:
+            assert_true(service.healthy())
+
+
+def test_pooled_driver_is_kept_in_the_cache():
+    with FakeChromeServer(revisions=range(929400, 929513)) as server, mktempdir() as tmpdir:
+        server.driver_zip = make_zip({"chromedriver": f"#!{sys.executable}\n{STUB_CHROMEDRIVER}".encode()})
+        cdm = ChromeDriverManager(version=96, base_path=tmpdir)
+        server.configure(cdm._cx)
+        cdm.get_browser()
+        with cdm.driver_service_pool(size=1) as pool:
+            assert_equal(cdm._cx.evict(max_size=0), [("chrome", "96.0.4664.45", "929512")])
+            with pool.lease(timeout=10) as service:
+                assert_true(service.healthy())
+        assert_equal(cdm._cx.evict(max_size=0), [("chromedriver", "96.0.4664.45", None)])
+